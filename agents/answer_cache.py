@@ -0,0 +1,136 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class SemanticAnswerCache:
+    """Answer cache that matches new questions to earlier ones by embedding.
+
+    Entries are scoped by a corpus fingerprint, so a hit is only served for
+    the same material. Optionally backed by SQLite to survive restarts.
+    """
+
+    def __init__(self, threshold=None, ttl=None, max_entries=None, db_path=None):
+        self.threshold = threshold if threshold is not None else float(
+            os.environ.get("ASTRALEARN_ANSWER_CACHE_THRESHOLD", "0.92")
+        )
+        self.ttl = ttl if ttl is not None else int(
+            os.environ.get("ASTRALEARN_ANSWER_CACHE_TTL", "86400")
+        )
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.environ.get("ASTRALEARN_ANSWER_CACHE_SIZE", "2000")
+        )
+        self.db_path = db_path or os.environ.get("ASTRALEARN_ANSWER_CACHE_DB")
+        self.hits = 0
+        self.misses = 0
+        # entry id -> (fingerprint, unit query vector, answer, created_at)
+        self._entries = OrderedDict()
+        # fingerprint -> entry ids, so lookups only scan the same corpus
+        self._by_fingerprint = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if self.db_path:
+            self._open_db()
+
+    def lookup(self, fingerprint, query_vector):
+        """Return the cached answer for a similar query, or None"""
+        vector = self._normalize(query_vector)
+        now = time.time()
+        with self._lock:
+            ids = [
+                entry_id
+                for entry_id in list(self._by_fingerprint.get(fingerprint, ()))
+                if not self._expire(entry_id, now)
+            ]
+            if ids:
+                matrix = np.stack([self._entries[entry_id][1] for entry_id in ids])
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    entry_id = ids[best]
+                    self._entries.move_to_end(entry_id)
+                    self.hits += 1
+                    return self._entries[entry_id][2]
+            self.misses += 1
+            return None
+
+    def store(self, fingerprint, query, query_vector, answer):
+        """Remember answer for query under the given corpus fingerprint"""
+        vector = self._normalize(query_vector)
+        created_at = time.time()
+        with self._lock:
+            entry_id = self._next_id
+            if self._db is not None:
+                cursor = self._db.execute(
+                    "INSERT INTO answers (fingerprint, query, vector, answer, created_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (fingerprint, query, vector.tobytes(), answer, created_at),
+                )
+                self._db.commit()
+                entry_id = cursor.lastrowid
+            self._add(entry_id, fingerprint, vector, answer, created_at)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+    def _open_db(self):
+        self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, fingerprint TEXT, query TEXT, "
+            "vector BLOB, answer TEXT, created_at REAL)"
+        )
+        self._db.execute(
+            "DELETE FROM answers WHERE created_at < ?", (time.time() - self.ttl,)
+        )
+        self._db.commit()
+        rows = self._db.execute(
+            "SELECT id, fingerprint, vector, answer, created_at FROM answers "
+            "ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,),
+        ).fetchall()
+        for entry_id, fingerprint, blob, answer, created_at in reversed(rows):
+            vector = np.frombuffer(blob, dtype=np.float32)
+            self._add(entry_id, fingerprint, vector, answer, created_at)
+
+    def _add(self, entry_id, fingerprint, vector, answer, created_at):
+        self._entries[entry_id] = (fingerprint, vector, answer, created_at)
+        self._by_fingerprint.setdefault(fingerprint, []).append(entry_id)
+        self._next_id = max(self._next_id, entry_id + 1)
+
+    def _expire(self, entry_id, now):
+        """Drop entry_id if it is past its TTL; return True if dropped"""
+        if now - self._entries[entry_id][3] <= self.ttl:
+            return False
+        self._remove(entry_id)
+        return True
+
+    def _remove(self, entry_id):
+        fingerprint = self._entries.pop(entry_id)[0]
+        ids = self._by_fingerprint.get(fingerprint, [])
+        ids.remove(entry_id)
+        if not ids:
+            self._by_fingerprint.pop(fingerprint, None)
+        if self._db is not None:
+            self._db.execute("DELETE FROM answers WHERE id = ?", (entry_id,))
+            self._db.commit()
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
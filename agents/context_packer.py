@@ -0,0 +1,65 @@
+import os
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a characters-per-token estimate
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+DEFAULT_CONTEXT_TOKENS = int(os.environ.get("ASTRALEARN_CONTEXT_TOKENS", "3000"))
+# Skip the partial last passage if less than this much budget is left
+MIN_PASSAGE_TOKENS = 48
+
+
+class ContextPacker:
+    """Fills a token budget with passages in relevance order.
+
+    Passages are added whole while they fit; the first one that does not
+    fit is truncated to the remaining budget and packing stops there.
+    """
+
+    def __init__(self, budget_tokens=None, encoding_name="cl100k_base"):
+        self.budget_tokens = budget_tokens or DEFAULT_CONTEXT_TOKENS
+        self._encoding = tiktoken.get_encoding(encoding_name) if tiktoken else None
+
+    def count(self, text):
+        """Token count of text (estimated when tiktoken is unavailable)"""
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+    def truncate(self, text, max_tokens):
+        """Cut text to at most max_tokens, ending on a word boundary"""
+        max_tokens -= 1  # room for the trailing "..."
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            if len(tokens) <= max_tokens:
+                return text
+            text = self._encoding.decode(tokens[:max_tokens])
+        elif len(text) <= max_tokens * CHARS_PER_TOKEN:
+            return text
+        else:
+            text = text[:max_tokens * CHARS_PER_TOKEN]
+        cut = text.rfind(" ")
+        return (text[:cut] if cut > 0 else text) + "..."
+
+    def chunk_budget(self, chunk_chars):
+        """How many chunks of about chunk_chars the budget can hold"""
+        return max(1, self.budget_tokens * CHARS_PER_TOKEN // max(chunk_chars, 1))
+
+    def pack(self, passages, budget_tokens=None):
+        """Return (packed passages, tokens used) for passages sorted best first"""
+        remaining = budget_tokens or self.budget_tokens
+        packed = []
+        for passage in passages:
+            tokens = self.count(passage)
+            if tokens <= remaining:
+                packed.append(passage)
+                remaining -= tokens
+                continue
+            if remaining >= MIN_PASSAGE_TOKENS:
+                passage = self.truncate(passage, remaining)
+                packed.append(passage)
+                remaining -= self.count(passage)
+            break
+        return packed, (budget_tokens or self.budget_tokens) - remaining
@@ -0,0 +1,156 @@
+import hashlib
+import re
+import sys
+from array import array
+from bisect import bisect_right
+
+
+def format_page(number, page_text):
+    """One page in the app's 'Page N:' text format, or '' if it is empty"""
+    page_text = (page_text or "").strip()
+    if not page_text:
+        return ""
+    return f"Page {number}:\n{page_text}\n\n"
+
+
+def locate_chunks(text, chunks, overlap):
+    """Start offset in text of each chunk produced by a splitter"""
+    starts = []
+    prev_start, prev_end = -1, 0
+    for chunk in chunks:
+        # Chunks overlap by at most chunk_overlap, so search from there;
+        # a plain find() would match repeated text too early
+        start = text.find(chunk, max(prev_end - overlap, prev_start + 1))
+        if start < 0:
+            start = text.find(chunk, prev_start + 1)
+        start = max(start, 0)
+        prev_start, prev_end = start, start + len(chunk)
+        starts.append(start)
+    return starts
+
+
+class CorpusFile:
+    """One uploaded file: its page texts stored once, with page offsets.
+
+    text holds every page in the app's "Page N:" format; page_starts and
+    page_numbers map character offsets back to real page numbers.
+    """
+
+    __slots__ = ("name", "text", "key", "word_count", "page_numbers", "page_starts")
+
+    def __init__(self, name, pages):
+        """pages is a list of (page_number, page_text); empty pages are skipped"""
+        self.name = name
+        self.page_numbers = array("I")
+        self.page_starts = array("I")
+        parts = []
+        offset = 0
+        for number, page_text in pages:
+            part = format_page(number, page_text)
+            if not part:
+                continue
+            self.page_numbers.append(number)
+            self.page_starts.append(offset)
+            parts.append(part)
+            offset += len(part)
+        self.text = "".join(parts)
+        self.word_count = len(self.text.split())
+        self.key = hashlib.sha256(
+            f"{name}\n{self.text}".encode("utf-8")
+        ).hexdigest()
+
+    def __bool__(self):
+        return bool(self.text.strip())
+
+    @property
+    def content(self):
+        """The file in the legacy '📚 FILE:' text format"""
+        return f"📚 FILE: {self.name}\n{self.text}"
+
+    def nbytes(self):
+        """Approximate memory held by the text and offset arrays"""
+        arrays = (self.page_numbers, self.page_starts)
+        return sys.getsizeof(self.text) + sum(len(a) * a.itemsize for a in arrays)
+
+    def page_at(self, offset):
+        """Page number that contains the character at offset"""
+        if not self.page_starts:
+            return None
+        i = bisect_right(self.page_starts, offset) - 1
+        return self.page_numbers[max(i, 0)]
+
+    def pages(self):
+        """Yield (page_number, page_text) without the page markers"""
+        for i, number in enumerate(self.page_numbers):
+            start = self.page_starts[i]
+            end = self.page_starts[i + 1] if i + 1 < len(self.page_starts) else len(self.text)
+            page_text = self.text[start:end]
+            yield number, page_text[page_text.index("\n") + 1:].strip()
+
+    def split(self, splitter):
+        """Chunk the file once, returning (chunk_text, metadata) pairs"""
+        texts = splitter.split_text(self.text)
+        starts = locate_chunks(self.text, texts, getattr(splitter, "_chunk_overlap", 0))
+        return [
+            (chunk, {"file_name": self.name, "page": self.page_at(start), "start": start})
+            for chunk, start in zip(texts, starts)
+        ]
+
+
+class Corpus:
+    """Ordered collection of CorpusFile objects, parsed once at upload"""
+
+    def __init__(self, files=None):
+        self.files = {}
+        for corpus_file in files or []:
+            self.add(corpus_file)
+
+    def add(self, corpus_file):
+        self.files[corpus_file.name] = corpus_file
+
+    def remove(self, file_name):
+        return self.files.pop(file_name, None)
+
+    def get(self, file_name):
+        return self.files.get(file_name)
+
+    def __iter__(self):
+        return iter(list(self.files.values()))
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, file_name):
+        return file_name in self.files
+
+    def combined_text(self):
+        """All files in the legacy '📚 FILE:' format, built on demand"""
+        return "\n\n".join(corpus_file.content for corpus_file in self)
+
+    @classmethod
+    def from_text(cls, text):
+        """Parse legacy combined text with '📚 FILE:' and 'Page N:' markers"""
+        corpus = cls()
+        for section in re.split(r'(?=📚 FILE:)', text):
+            if not section.strip():
+                continue
+            match = re.match(r'📚 FILE:\s*([^\n]+)\n?', section)
+            file_name = match.group(1).strip() if match else "Course Materials"
+            body = section[match.end():] if match else section
+            corpus.add(CorpusFile(file_name, cls._parse_pages(body)))
+        return corpus
+
+    @staticmethod
+    def _parse_pages(body):
+        parts = re.split(r'^Page (\d+):\n', body, flags=re.MULTILINE)
+        pages = []
+        for i in range(1, len(parts) - 1, 2):
+            pages.append((int(parts[i]), parts[i + 1]))
+        if parts[0].strip():
+            # Text before the first marker belongs to page 1; merge it
+            # into an explicit "Page 1:" rather than numbering two pages 1
+            if pages and pages[0][0] == 1:
+                pages[0] = (1, parts[0] + pages[0][1])
+            else:
+                pages.insert(0, (1, parts[0]))
+        return pages
@@ -0,0 +1,132 @@
+import hashlib
+import os
+import threading
+import weakref
+from collections import OrderedDict
+
+
+def content_key(file_name, data):
+    """Key of an uploaded file; the name is included because answers cite it"""
+    digest = hashlib.sha256(f"{file_name}\n".encode("utf-8"))
+    digest.update(data)
+    return digest.hexdigest()
+
+
+class Lease:
+    """A session's reference to a shared entry; value must not be modified"""
+
+    __slots__ = ("key", "value", "_finalizer", "__weakref__")
+
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+
+    def release(self):
+        """Drop the reference now instead of when the session is collected"""
+        self._finalizer()
+
+    @property
+    def alive(self):
+        return self._finalizer.alive
+
+
+class CorpusStore:
+    """Process-wide, reference-counted store of parsed files and their indexes.
+
+    Entries are keyed by content hash and handed out as Leases, so sessions
+    that upload the same material share one copy. An entry is referenced
+    while any of its leases is alive; a lease is dropped by release() or
+    when its session is garbage collected. Unreferenced entries are kept for
+    reuse until the approximate total size passes max_bytes, then evicted
+    least recently used first.
+    """
+
+    def __init__(self, max_bytes=None):
+        if max_bytes is None:
+            max_mb = int(os.environ.get("ASTRALEARN_CORPUS_STORE_MB", "1024"))
+            max_bytes = max_mb * 1024 * 1024
+        self.max_bytes = max_bytes
+        # key -> [value, size in bytes, live leases], least recently used first
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Reentrant: garbage collection inside a locked section can run a
+        # lease finalizer on the same thread
+        self._lock = threading.RLock()
+
+    def attach(self, key):
+        """Lease on the entry for key, or None if it is not stored"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return self._lease(key, entry)
+
+    def publish(self, key, value, size):
+        """Store value under key and lease it.
+
+        If another session stored the same key first, the lease is on its
+        value and the caller's copy can be dropped.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = [value, size, 0]
+                self._bytes += size
+            else:
+                self._entries.move_to_end(key)
+            lease = self._lease(key, entry)
+            self._evict()
+            return lease
+
+    def withdraw(self, lease):
+        """Release lease; its value if the caller held the only reference.
+
+        The entry is then removed from the store, so its value is private
+        and may be modified. Returns None while other sessions still use it.
+        """
+        with self._lock:
+            entry = self._entries.get(lease.key)
+            owned = (
+                entry is not None and entry[0] is lease.value
+                and entry[2] == 1 and lease.alive
+            )
+            if owned:
+                del self._entries[lease.key]
+                self._bytes -= entry[1]
+        lease.release()
+        return lease.value if owned else None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "referenced": sum(1 for entry in self._entries.values() if entry[2]),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _lease(self, key, entry):
+        entry[2] += 1
+        lease = Lease(key, entry[0])
+        lease._finalizer = weakref.finalize(lease, self._release, key, entry)
+        return lease
+
+    def _release(self, key, entry):
+        with self._lock:
+            entry[2] -= 1
+            # Compare the entry itself: key may have been withdrawn and reused
+            if entry[2] == 0 and self._entries.get(key) is entry:
+                self._entries.move_to_end(key)
+                self._evict()
+
+    def _evict(self):
+        if self._bytes <= self.max_bytes:
+            return
+        for key in [key for key, entry in self._entries.items() if not entry[2]]:
+            if self._bytes <= self.max_bytes:
+                break
+            entry = self._entries.get(key)
+            if entry is not None and not entry[2]:
+                del self._entries[key]
+                self._bytes -= entry[1]
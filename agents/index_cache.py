@@ -0,0 +1,192 @@
+import hashlib
+import os
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+
+from langchain_community.vectorstores import FAISS
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction runs unlocked, renames stay atomic
+    fcntl = None
+
+
+DEFAULT_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "astralearn", "faiss"
+)
+STALE_TMP_SECONDS = 3600
+
+
+class IndexCache:
+    """Content-addressed on-disk cache of FAISS indexes with LRU eviction.
+
+    Entries are published with an atomic directory rename, so several
+    Streamlit sessions (or processes) can share one cache directory safely.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or os.environ.get(
+            "ASTRALEARN_INDEX_CACHE_DIR", DEFAULT_CACHE_DIR
+        )
+        if max_bytes is None:
+            max_mb = int(os.environ.get("ASTRALEARN_INDEX_CACHE_MB", "2048"))
+            max_bytes = max_mb * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._lock_path = os.path.join(self.cache_dir, ".lock")
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(text, **settings):
+        """Hash the text together with the settings that shaped its index"""
+        digest = hashlib.sha256()
+        for name in sorted(settings):
+            digest.update(f"{name}={settings[name]}\n".encode("utf-8"))
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def load(self, key, embeddings):
+        """Return the cached FAISS store for key, or None on a miss"""
+        path = self._entry_path(key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            store = FAISS.load_local(path, embeddings)
+        except Exception as e:
+            # Entry was evicted mid-read or is corrupt - treat as a miss
+            print(f"Index cache miss for {key[:12]}: {e}")
+            return None
+        self._touch(path)
+        return store
+
+    def save(self, key, store):
+        """Persist a FAISS store under key and evict old entries if needed"""
+        path = self._entry_path(key)
+        if os.path.isdir(path):
+            self._touch(path)
+            return
+
+        tmp_path = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        try:
+            store.save_local(tmp_path)
+            try:
+                os.rename(tmp_path, path)
+            except OSError:
+                # Another session published the same entry first
+                pass
+        except Exception as e:
+            print(f"Could not write index cache entry {key[:12]}: {e}")
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+
+        self.evict()
+
+    def link(self, alias, key):
+        """Record that alias (e.g. a hash of the source bytes) maps to entry key"""
+        tmp_path = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        try:
+            with open(tmp_path, "w") as handle:
+                handle.write(key)
+            os.replace(tmp_path, self._alias_path(alias))
+        except OSError as e:
+            print(f"Could not write index cache alias {alias[:12]}: {e}")
+
+    def resolve(self, alias):
+        """Entry key recorded for alias, or None if the entry is gone"""
+        try:
+            with open(self._alias_path(alias)) as handle:
+                key = handle.read().strip()
+        except OSError:
+            return None
+        return key if os.path.isdir(self._entry_path(key)) else None
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits max_bytes"""
+        with self._locked():
+            entries = []
+            total = 0
+            now = time.time()
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                if name.endswith(".alias"):
+                    if self.resolve(name[:-len(".alias")]) is None:
+                        self._remove_file(path)
+                    continue
+                if not os.path.isdir(path):
+                    if name.startswith(".tmp-") and now - self._mtime(path) > STALE_TMP_SECONDS:
+                        self._remove_file(path)
+                    continue
+                if name.startswith("."):
+                    # Clean up temp dirs left behind by crashed writers
+                    if now - self._mtime(path) > STALE_TMP_SECONDS:
+                        shutil.rmtree(path, ignore_errors=True)
+                    continue
+                size = self._dir_size(path)
+                total += size
+                entries.append((self._mtime(path), size, path))
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _alias_path(self, alias):
+        return os.path.join(self.cache_dir, f"{alias}.alias")
+
+    @staticmethod
+    def _remove_file(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _remove(self, path):
+        # Rename first so concurrent readers never see a half-deleted entry
+        trash_path = os.path.join(self.cache_dir, f".trash-{uuid.uuid4().hex}")
+        try:
+            os.rename(path, trash_path)
+        except OSError:
+            return
+        shutil.rmtree(trash_path, ignore_errors=True)
+
+    @contextmanager
+    def _locked(self):
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _touch(path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _mtime(path):
+        try:
+            return os.path.getmtime(path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def _dir_size(path):
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+        return size
@@ -1,26 +1,148 @@
+import asyncio
+import uuid
+
+from agents import tracing
 from agents.summarizer import SummarizerAgent
 from agents.test_generator import TestGeneratorAgent
 from agents.langchain_wrapper import LangChainRAG
+from agents.corpus import Corpus, CorpusFile
+from agents.mcq_prefetch import MCQPrefetcher
+from agents.mcq_sampler import CoverageSampler
+from agents.resources import get_reranker, get_summary_store
+from agents.scheduler import INTERACTIVE, NORMAL, llm_context
 
 
 class InternTAAgentsManager:
     def __init__(self, api_key: str):
-        self.text = ""
+        # LLM calls are queued fairly across sessions sharing an API key
+        self.session_id = uuid.uuid4().hex[:12]
         self.summarizer = SummarizerAgent(api_key)
         self.testgen = TestGeneratorAgent(api_key)
-        self.rag = LangChainRAG(api_key)
+        self.rag = LangChainRAG(api_key, reranker=get_reranker())
+        self.mcq_sampler = CoverageSampler(self.rag)
+        self.summary_store = get_summary_store()
+        self.mcq_prefetcher = MCQPrefetcher(self._generate_mcq_batch)
+
+    @property
+    def corpus(self) -> Corpus:
+        return self.rag.corpus
+
+    @property
+    def text(self) -> str:
+        """All material in the legacy combined-text format, built on demand"""
+        return self.corpus.combined_text()
 
     def load_material(self, text: str):
-        self.text = text
-        self.rag.load_text(text)
+        self.load_corpus(Corpus.from_text(text))
+
+    def load_corpus(self, corpus: Corpus):
+        self.rag.load_corpus(corpus)
+        self.mcq_prefetcher.reset()
+        with llm_context(self.session_id):
+            for corpus_file in self.corpus:
+                self.summary_store.prefetch(corpus_file, self.summarizer)
+
+    def add_file(self, corpus_file: CorpusFile):
+        self.rag.add_file(corpus_file)
+        self.mcq_prefetcher.reset()
+        # Summarize in the background so a later summary request is instant
+        with llm_context(self.session_id):
+            self.summary_store.prefetch(corpus_file, self.summarizer)
+
+    def add_files(self, corpus_files):
+        """Add several files at once, so an index shared by other sessions is reused"""
+        self.rag.add_files(corpus_files)
+        self.mcq_prefetcher.reset()
+        with llm_context(self.session_id):
+            for corpus_file in corpus_files:
+                self.summary_store.prefetch(corpus_file, self.summarizer)
+
+    def remove_file(self, file_name: str):
+        self.rag.remove_file(file_name)
+        self.mcq_prefetcher.reset()
 
     def run_rag(self, query: str):
-        return self.rag.run(query)
+        with llm_context(self.session_id, INTERACTIVE):
+            return self.rag.run(query)
+
+    def run_rag_stream(self, query: str):
+        with llm_context(self.session_id, INTERACTIVE):
+            yield from self.rag.run_stream(query)
+
+    async def arun_rag(self, query: str):
+        with llm_context(self.session_id, INTERACTIVE):
+            return await self.rag.arun(query)
 
     def run_summary(self, query: str):
-        return self.summarizer.summarize(self.text)
+        return "".join(self.run_summary_stream(query)).strip()
+
+    @tracing.traced("manager.summary")
+    def run_summary_stream(self, query: str):
+        # Assemble the per-file summaries precomputed at upload time
+        found = False
+        for corpus_file in self.corpus:
+            with llm_context(self.session_id, NORMAL):
+                section = self.summary_store.get(corpus_file, self.summarizer)
+            if section:
+                found = True
+                yield section + "\n\n"
+        if not found:
+            yield "• No content found in the uploaded materials."
 
+    @tracing.traced("manager.summary")
+    async def arun_summary(self, query: str):
+        # Files are summarized concurrently; finished ones come from the store
+        with llm_context(self.session_id, NORMAL):
+            sections = await asyncio.gather(*(
+                self.summary_store.aget(corpus_file, self.summarizer)
+                for corpus_file in self.corpus
+            ))
+        sections = [section for section in sections if section]
+        if not sections:
+            return "• No content found in the uploaded materials."
+        return "\n\n".join(sections)
+
+    @tracing.traced("manager.mcq")
     def generate_mcq(self):
-        if not self.text:
+        if not self.corpus:
+            return "No material loaded", ["Please upload material first"], "A", "No explanation available"
+
+        with llm_context(self.session_id, NORMAL):
+            # Serve from the prefetch queue, joining a refill already under
+            # way rather than sending a second batch request
+            mcq = self.mcq_prefetcher.get(wait=True)
+            if mcq:
+                return mcq
+
+            batch = self._generate_mcq_batch()
+            if not batch:
+                return self.testgen.generate_single_mcq(self.text)
+            self.mcq_prefetcher.put_many(batch[1:])
+            return batch[0]
+
+    @tracing.traced("manager.mcq")
+    async def agenerate_mcq(self):
+        if not self.corpus:
             return "No material loaded", ["Please upload material first"], "A", "No explanation available"
-        return self.testgen.generate_single_mcq(self.text)
\ No newline at end of file
+
+        with llm_context(self.session_id, NORMAL):
+            mcq = await asyncio.to_thread(self.mcq_prefetcher.get, True)
+            if mcq:
+                return mcq
+
+            # Sampling and duplicate checks embed text, so keep them off the loop
+            passages = await asyncio.to_thread(self.mcq_sampler.sample) or self.text
+            batch = await self.testgen.agenerate_mcq_batch(passages)
+            batch = await asyncio.to_thread(self._drop_duplicates, batch)
+            if not batch:
+                return await self.testgen.agenerate_single_mcq(self.text)
+            self.mcq_prefetcher.put_many(batch[1:])
+            return batch[0]
+
+    def _generate_mcq_batch(self):
+        # Small, constant-size prompts drawn from across the whole index
+        passages = self.mcq_sampler.sample() or self.text
+        return self._drop_duplicates(self.testgen.generate_mcq_batch(passages))
+
+    def _drop_duplicates(self, batch):
+        return [mcq for mcq in batch if not self.mcq_sampler.is_duplicate(mcq[0])]
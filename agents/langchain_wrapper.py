@@ -1,44 +1,630 @@
-from groq import Groq
+import asyncio
+import contextvars
+import copy
+import time
+from contextlib import contextmanager
+
 from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
-import re
+import faiss
+import numpy as np
+from agents import tracing
+from agents.context_packer import ContextPacker
+from agents.corpus import Corpus
+from agents.index_cache import IndexCache
+from agents.retrieval import BM25Index, reciprocal_rank_fusion
+from agents.resources import (
+    DEFAULT_EMBEDDING_MODEL, EMBEDDING_BACKEND, get_answer_cache,
+    get_async_groq_client, get_corpus_store, get_embeddings, get_groq_client,
+)
+from agents.vector_index import COMPRESSION_RANK, IndexConfig
+
+# Bump when the stored chunk text or metadata changes shape
+INDEX_FORMAT = 2
+
+
+class CorpusIndex:
+    """Vector store, keyword index and files of one set of indexed files.
+
+    Published to the CorpusStore, so sessions that indexed the same files
+    search one copy; a published CorpusIndex is never modified.
+    """
+
+    def __init__(self):
+        self.vectorstore = None
+        self.retriever = None
+        # Per-file stores are cached flat; the merged store may be quantized
+        self.index_type = "flat"
+        # Sparse keyword index kept in step with the FAISS store
+        self.bm25 = BM25Index()
+        # content key -> docstore ids of its chunks in the vector store
+        self.key_ids = {}
+        # content key -> CorpusFile
+        self.files = {}
+
+    def copy(self):
+        """Private copy to change; vectors and ids are copied, Documents shared"""
+        other = CorpusIndex()
+        if self.vectorstore is not None:
+            store = copy.copy(self.vectorstore)
+            store.index = faiss.clone_index(self.vectorstore.index)
+            store.docstore = InMemoryDocstore(dict(self.vectorstore.docstore._dict))
+            store.index_to_docstore_id = dict(self.vectorstore.index_to_docstore_id)
+            other.vectorstore = store
+            other.retriever = store.as_retriever(search_kwargs={"k": 15})
+        other.index_type = self.index_type
+        other.bm25 = self.bm25.copy()
+        other.key_ids = {key: list(ids) for key, ids in self.key_ids.items()}
+        other.files = dict(self.files)
+        return other
+
+    def nbytes(self):
+        """Approximate memory: vectors, plus each file's text held three times
+        (the file, its chunks in the docstore and the keyword index)"""
+        size = 3 * sum(corpus_file.nbytes() for corpus_file in self.files.values())
+        if self.vectorstore is None:
+            return size
+        index = self.vectorstore.index
+        try:
+            per_vector = index.sa_code_size()
+        except RuntimeError:
+            # HNSW: the vectors plus about as much again for graph links
+            per_vector = index.d * 8
+        return size + index.ntotal * per_vector
+
+
+def _index_attribute(name):
+    """An attribute of the session's CorpusIndex, exposed on LangChainRAG"""
+    return property(
+        lambda self: getattr(self._index, name),
+        lambda self, value: setattr(self._index, name, value),
+    )
 
 
 class LangChainRAG:
-    def __init__(self, api_key, model_name="llama-3.1-8b-instant"):
-        self.client = Groq(api_key=api_key)
+    vectorstore = _index_attribute("vectorstore")
+    retriever = _index_attribute("retriever")
+    index_type = _index_attribute("index_type")
+    bm25 = _index_attribute("bm25")
+    key_ids = _index_attribute("key_ids")
+
+    def __init__(self, api_key, model_name="llama-3.1-8b-instant",
+                 embedding_model_name=DEFAULT_EMBEDDING_MODEL,
+                 index_cache=None, answer_cache=None, hybrid=True, reranker=None,
+                 context_tokens=None, index_config=None, embedding_backend=None,
+                 corpus_store=None):
+        self.api_key = api_key
+        self.client = get_groq_client(api_key)
         self.model = model_name
+        self.chunk_size = 1000  # Back to normal chunk size
+        self.chunk_overlap = 150
         self.splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,  # Back to normal chunk size
-            chunk_overlap=150
+            chunk_size=self.chunk_size,
+            chunk_overlap=self.chunk_overlap
         )
-        self.embeddings = HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2"
-        )
-        self.vectorstore = None
-        self.retriever = None
-        self.raw_text = ""
-        self.file_markers = {}
+        self.embedding_model_name = embedding_model_name
+        self.embedding_backend = embedding_backend or EMBEDDING_BACKEND
+        # Shared across sessions; loading the model per user is too costly
+        self.embeddings = get_embeddings(self.embedding_model_name, self.embedding_backend)
+        self.index_cache = index_cache or IndexCache()
+        # Shared by every session so paraphrased questions hit across users
+        self.answer_cache = answer_cache or get_answer_cache()
+        # Indexes are shared with every session that indexed the same files;
+        # _lease holds the session's reference while _index is published
+        self.corpus_store = corpus_store or get_corpus_store()
+        self._index = CorpusIndex()
+        self._lease = None
+        self.index_config = index_config or IndexConfig()
+        self.hybrid = hybrid
+        # Candidates per retriever, and fused chunks that reach the prompt
+        self.fetch_k = 20
+        self.top_k = 8
+        # Optional CrossEncoderReranker that picks the passages for the prompt
+        self.reranker = reranker
+        # Prompt context is packed into a token budget, best passages first
+        self.packer = ContextPacker(context_tokens)
+        # Per thread and per asyncio task, so concurrent run()/arun() calls
+        # each see their own numbers
+        self._timings = contextvars.ContextVar(f"rag_timings_{id(self)}", default=None)
+        self._usage = contextvars.ContextVar(f"rag_usage_{id(self)}", default=None)
+        self.corpus = Corpus()
+        # file name -> content key of its cached index
+        self.file_keys = {}
+
+    @property
+    def last_timings(self):
+        """Milliseconds spent in each stage of the current thread/task's last run()"""
+        timings = self._timings.get()
+        if timings is None:
+            timings = {}
+            self._timings.set(timings)
+        return timings
+
+    @last_timings.setter
+    def last_timings(self, timings):
+        self._timings.set(timings)
+
+    @property
+    def last_usage(self):
+        """Context/prompt/completion token counts of the current thread/task's last run()"""
+        usage = self._usage.get()
+        if usage is None:
+            usage = {}
+            self._usage.set(usage)
+        return usage
+
+    @last_usage.setter
+    def last_usage(self, usage):
+        self._usage.set(usage)
 
     def load_text(self, txt):
-        self.raw_text = txt
-        # Extract and store file markers
-        self.file_markers = self._extract_all_file_markers(txt)
-        
-        chunks = self.splitter.split_text(txt)
-        self.vectorstore = FAISS.from_texts(chunks, self.embeddings)
-        # Use standard retrieval without strict filters
-        self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 15})
+        """Replace the indexed material with the files found in txt"""
+        self.load_corpus(Corpus.from_text(txt))
+
+    def load_corpus(self, corpus):
+        """Replace the indexed material with the files of a parsed Corpus"""
+        self.clear()
+        self.add_files(list(corpus))
+
+    def clear(self):
+        """Drop all indexed files"""
+        self._release_index()
+        self._index = CorpusIndex()
+        self.corpus = Corpus()
+        self.file_keys = {}
+
+    def add_files(self, corpus_files):
+        """Index several files, attaching to a shared index of the same files if one exists"""
+        file_keys = dict(self.file_keys)
+        for corpus_file in corpus_files:
+            file_keys[corpus_file.name] = self._index_key(corpus_file)
+        if file_keys != self.file_keys and self._attach(file_keys):
+            return
+        for corpus_file in corpus_files:
+            self.add_file(corpus_file)
+
+    @tracing.traced("rag.add_file")
+    def add_file(self, corpus_file, store=None):
+        """Index a single CorpusFile, reusing the cache and leaving other files alone.
+
+        store is an already embedded flat FAISS store for the file (from the
+        streaming ingestion pipeline); it is cached instead of re-embedding.
+        """
+        key = self._index_key(corpus_file)
+        if self.file_keys.get(corpus_file.name) == key:
+            return
+        if store is not None:
+            self.index_cache.save(key, store)
+        if self._attach({**self.file_keys, corpus_file.name: key}):
+            return
+
+        self._own_index()
+        if corpus_file.name in self.file_keys:
+            self._remove_file(corpus_file.name)
+        self._add_file(corpus_file, key, store)
+        self._publish()
 
+    def remove_file(self, file_name):
+        """Drop a file's chunks from the vector store by id"""
+        if file_name not in self.file_keys:
+            self.corpus.remove(file_name)
+            return
+        remaining = {name: key for name, key in self.file_keys.items() if name != file_name}
+        if not remaining:
+            self.clear()
+            return
+        if self._attach(remaining):
+            return
+
+        self._own_index()
+        self._remove_file(file_name)
+        self._publish()
+
+    def _add_file(self, corpus_file, key, store=None):
+        self.corpus.add(corpus_file)
+        self.file_keys[corpus_file.name] = key
+        self._index.files[key] = corpus_file
+        if store is None:
+            store = self._build_file_store(corpus_file, key)
+        if store is None:
+            return
+
+        ids = list(store.index_to_docstore_id.values())
+        self.key_ids[key] = ids
+        self.bm25.add(ids, [store.docstore.search(doc_id).page_content for doc_id in ids])
+        if self.vectorstore is None:
+            self.vectorstore = store
+            self.index_type = "flat"
+            # Use standard retrieval without strict filters
+            self.retriever = self.vectorstore.as_retriever(search_kwargs={"k": 15})
+        elif self.index_type == "flat":
+            self.vectorstore.merge_from(store)
+        else:
+            self._merge_vectors(store)
+        self._maybe_migrate_index()
+
+    def _remove_file(self, file_name):
+        self.corpus.remove(file_name)
+        key = self.file_keys.pop(file_name, None)
+        self._index.files.pop(key, None)
+        ids = self.key_ids.pop(key, None)
+        if ids:
+            self.bm25.remove(ids)
+        if not self.key_ids:
+            self.vectorstore = None
+            self.retriever = None
+            self.index_type = "flat"
+        elif ids and self.index_type in ("hnsw", "ivfpq"):
+            self._rebuild_without(ids)
+        elif ids:
+            self.vectorstore.delete(ids)
+
+    def _attach(self, file_keys):
+        """Switch to the shared index over exactly these files, if one exists"""
+        lease = self.corpus_store.attach(self._store_key(file_keys))
+        if lease is None:
+            return False
+        self._adopt(lease, file_keys)
+        return True
+
+    def _publish(self):
+        """Share the session's index with every session indexing the same files"""
+        if not self.file_keys:
+            return
+        lease = self.corpus_store.publish(
+            self._store_key(self.file_keys), self._index, self._index.nbytes()
+        )
+        # Another session may have published the same files first
+        self._adopt(lease, self.file_keys)
+
+    def _adopt(self, lease, file_keys):
+        file_keys = dict(file_keys)
+        self._release_index()
+        self._lease = lease
+        self._index = lease.value
+        self.file_keys = file_keys
+        # Point at the shared files so their text is held once
+        self.corpus = Corpus(self._index.files[key] for key in file_keys.values())
+
+    def _own_index(self):
+        """Make the session's index private before changing it"""
+        if self._lease is None:
+            return
+        lease, self._lease = self._lease, None
+        index = self.corpus_store.withdraw(lease)
+        # Still searched by other sessions: change a copy instead
+        self._index = index if index is not None else self._index.copy()
+
+    def _release_index(self):
+        if self._lease is not None:
+            self._lease.release()
+            self._lease = None
+
+    def _store_key(self, file_keys):
+        """Corpus store key of the merged index over files with these content keys"""
+        return ("index", IndexCache.make_key(
+            "\n".join(sorted(file_keys.values())), **vars(self.index_config)
+        ))
+
+    def get_file_chunks(self):
+        """Return {file name: [(doc id, chunk Document), ...]} in document order"""
+        file_chunks = {}
+        if self.vectorstore is None:
+            return file_chunks
+        for file_name, key in self.file_keys.items():
+            docs = []
+            for doc_id in self.key_ids.get(key, []):
+                doc = self.vectorstore.docstore.search(doc_id)
+                if not isinstance(doc, str):  # docstore returns a message when missing
+                    docs.append((doc_id, doc))
+            file_chunks[file_name] = docs
+        return file_chunks
+
+    def _maybe_migrate_index(self):
+        """Re-encode the merged store once it grows into a more compact index type"""
+        vectors_count = self.vectorstore.index.ntotal
+        target = self.index_config.target_type(vectors_count)
+        if COMPRESSION_RANK[target] <= COMPRESSION_RANK[self.index_type]:
+            return
+        # Positions are kept, so index_to_docstore_id stays valid
+        vectors = self.vectorstore.index.reconstruct_n(0, vectors_count)
+        try:
+            self.vectorstore.index = self.index_config.build(target, vectors)
+        except RuntimeError as e:
+            print(f"Could not build {target} index, keeping {self.index_type}: {e}")
+            return
+        self.index_type = target
+
+    def _merge_vectors(self, store):
+        """Add a flat per-file store's vectors and docs to a non-flat merged store"""
+        vectors = store.index.reconstruct_n(0, store.index.ntotal)
+        offset = len(self.vectorstore.index_to_docstore_id)
+        self.vectorstore.index.add(vectors)
+        docs = {}
+        for position, doc_id in store.index_to_docstore_id.items():
+            self.vectorstore.index_to_docstore_id[offset + position] = doc_id
+            docs[doc_id] = store.docstore.search(doc_id)
+        self.vectorstore.docstore.add(docs)
+
+    def _rebuild_without(self, ids):
+        """Drop ids from HNSW/IVF indexes, which cannot remove and renumber in place"""
+        removed = set(ids)
+        mapping = self.vectorstore.index_to_docstore_id
+        keep = [position for position in sorted(mapping) if mapping[position] not in removed]
+        index = self.vectorstore.index
+        vectors = index.reconstruct_n(0, index.ntotal)[keep]
+        if self.index_type == "hnsw":
+            self.vectorstore.index = self.index_config.build("hnsw", vectors)
+        else:
+            # Reuse the trained quantizers instead of training again
+            index = faiss.clone_index(index)
+            index.reset()
+            index.add(vectors)
+            self.vectorstore.index = index
+        self.vectorstore.index_to_docstore_id = {
+            i: mapping[position] for i, position in enumerate(keep)
+        }
+        self.vectorstore.docstore.delete(ids)
+
+    def _index_key(self, corpus_file):
+        """Cache key covering the file plus chunker and embedding settings"""
+        return IndexCache.make_key(corpus_file.key, **self.index_settings())
+
+    def index_settings(self):
+        """Settings that shape a file's index, for cache keys"""
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "embedding_model": self._embedding_id(),
+            "index_format": INDEX_FORMAT,
+        }
+
+    def _embedding_id(self):
+        """Embedding model plus backend; int8 ONNX vectors differ slightly"""
+        if self.embedding_backend == "torch":
+            # Keeps cache keys from before backends were selectable valid
+            return self.embedding_model_name
+        return f"{self.embedding_model_name}@{self.embedding_backend}"
+
+    def _build_file_store(self, corpus_file, key):
+        """Load a file's FAISS store from the cache or embed it from scratch"""
+        store = self.index_cache.load(key, self.embeddings)
+        if store is not None:
+            return store
+
+        with tracing.span("rag.split"):
+            chunks = corpus_file.split(self.splitter)
+        if not chunks:
+            return None
+
+        texts = [text for text, _ in chunks]
+        metadatas = [metadata for _, metadata in chunks]
+        # Deterministic ids so a file's chunks can be removed later
+        ids = [f"{key[:16]}-{i}" for i in range(len(chunks))]
+        with tracing.span("rag.embed_chunks", chunks=len(texts)):
+            vectors = self.embeddings.embed_documents(texts)
+        with tracing.span("rag.index_build"):
+            store = FAISS.from_embeddings(
+                list(zip(texts, vectors)), self.embeddings, metadatas=metadatas, ids=ids
+            )
+        self.index_cache.save(key, store)
+        return store
+
+    @tracing.traced("rag.run")
     def run(self, query):
         if not self.retriever:
             return "Please load material first using load_text() method."
-            
+
+        self.last_timings = {}
+        self.last_usage = {}
+        # Embed once and reuse the vector for the cache and the retrieval
+        with self._timed("embed"):
+            query_vector = self.embeddings.embed_query(query)
+        with self._timed("cache"):
+            cached = self._cached_answer(query_vector)
+        if cached is not None:
+            return cached
+
+        prompt = self._build_prompt(query, query_vector)
+        try:
+            with self._timed("generate"):
+                res = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                    max_tokens=2500,
+                )
+            answer = res.choices[0].message.content
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+
+        usage = getattr(res, "usage", None)
+        if usage is not None:
+            self.last_usage["prompt_tokens"] = usage.prompt_tokens
+            self.last_usage["completion_tokens"] = usage.completion_tokens
+            tracing.record_usage("rag", self.model, usage)
+
+        self._cache_answer(query, query_vector, answer)
+        return answer
+
+    @tracing.traced("rag.run")
+    async def arun(self, query):
+        """Async run(): embedding and retrieval go to worker threads, the LLM
+        call stays on the event loop"""
+        if not self.retriever:
+            return "Please load material first using load_text() method."
+
+        # Fresh dicts in this task's context; to_thread() shares them
+        self.last_timings = {}
+        self.last_usage = {}
+        with self._timed("embed"):
+            query_vector = await asyncio.to_thread(self.embeddings.embed_query, query)
+        with self._timed("cache"):
+            cached = await asyncio.to_thread(self._cached_answer, query_vector)
+        if cached is not None:
+            return cached
+
+        prompt = await asyncio.to_thread(self._build_prompt, query, query_vector)
+        try:
+            with self._timed("generate"):
+                res = await get_async_groq_client(self.api_key).chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                    max_tokens=2500,
+                )
+            answer = res.choices[0].message.content
+        except Exception as e:
+            return f"Error generating response: {str(e)}"
+
+        usage = getattr(res, "usage", None)
+        if usage is not None:
+            self.last_usage["prompt_tokens"] = usage.prompt_tokens
+            self.last_usage["completion_tokens"] = usage.completion_tokens
+            tracing.record_usage("rag", self.model, usage)
+        await asyncio.to_thread(self._cache_answer, query, query_vector, answer)
+        return answer
+
+    @tracing.traced("rag.run")
+    def run_stream(self, query):
+        """Like run(), but yield the answer token by token as it arrives"""
+        if not self.retriever:
+            yield "Please load material first using load_text() method."
+            return
+
+        self.last_timings = {}
+        self.last_usage = {}
+        with self._timed("embed"):
+            query_vector = self.embeddings.embed_query(query)
+        with self._timed("cache"):
+            cached = self._cached_answer(query_vector)
+        if cached is not None:
+            yield cached
+            return
+
+        prompt = self._build_prompt(query, query_vector)
+        tokens = []
+        start = time.perf_counter()
+        try:
+            with tracing.span("rag.generate") as span:
+                stream = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": prompt}],
+                    temperature=0.3,
+                    max_tokens=2500,
+                    stream=True,
+                )
+                usage = None
+                for chunk in stream:
+                    # Groq reports usage on the last chunk, under x_groq
+                    x_groq = getattr(chunk, "x_groq", None)
+                    usage = getattr(x_groq, "usage", None) or getattr(chunk, "usage", None) or usage
+                    token = chunk.choices[0].delta.content if chunk.choices else None
+                    if token:
+                        if not tokens:
+                            self.last_timings["first_token"] = (time.perf_counter() - start) * 1000
+                            span.set(first_token_ms=round(self.last_timings["first_token"], 1))
+                        tokens.append(token)
+                        yield token
+            self.last_timings["generate"] = (time.perf_counter() - start) * 1000
+        except Exception as e:
+            yield f"Error generating response: {str(e)}"
+            return
+
+        answer = "".join(tokens)
+        if usage is not None:
+            self.last_usage["prompt_tokens"] = usage.prompt_tokens
+            self.last_usage["completion_tokens"] = usage.completion_tokens
+            tracing.record_usage("rag", self.model, usage)
+        else:
+            # No usage in the stream: fall back to local counts, kept apart
+            self.last_usage["completion_tokens"] = self.packer.count(answer)
+            tracing.record_usage("rag", self.model, self.last_usage, estimated=True)
+        self._cache_answer(query, query_vector, answer)
+
+    def retrieve(self, query, query_vector, hybrid=None, k=None):
+        """Top k chunks for query: dense FAISS hits, fused with BM25 when hybrid"""
+        hybrid = self.hybrid if hybrid is None else hybrid
+        if not hybrid:
+            ranked_ids = self._dense_search(query_vector, k or 15)
+        else:
+            fetch_k = max(self.fetch_k, k or 0)
+            dense_ids = self._dense_search(query_vector, fetch_k)
+            sparse_ids = [doc_id for doc_id, _ in self.bm25.search(query, fetch_k)]
+            fused = reciprocal_rank_fusion([dense_ids, sparse_ids])
+            ranked_ids = [doc_id for doc_id, _ in fused[:k or self.top_k]]
+
+        docs = []
+        for doc_id in ranked_ids:
+            doc = self.vectorstore.docstore.search(doc_id)
+            if not isinstance(doc, str):
+                docs.append(doc)
+        return docs
+
+    def select_passages(self, query, query_vector):
+        """Retrieve chunks for query and, if a reranker is set, keep its best ones"""
+        # Fetch as many chunks as the context budget can hold, plus slack
+        # for short chunks; the packer trims whatever does not fit
+        k = self.packer.chunk_budget(self.chunk_size) + 2
+        if self.reranker is None:
+            with self._timed("retrieve"):
+                return self.retrieve(query, query_vector, k=k)
+
+        # Hand the reranker a wider candidate pool than the prompt would get
+        with self._timed("retrieve"):
+            docs = self.retrieve(
+                query, query_vector, k=max(k, self.reranker.candidates)
+            )
+        # Only the reranker's own top_n reach the prompt; the packer fits
+        # those into the token budget
+        with self._timed("rerank"):
+            return self.reranker.rerank(query, docs)
+
+    @contextmanager
+    def _timed(self, stage):
+        start = time.perf_counter()
+        try:
+            with tracing.span(f"rag.{stage}"):
+                yield
+        finally:
+            self.last_timings[stage] = (time.perf_counter() - start) * 1000
+
+    def _dense_search(self, query_vector, k):
+        """Docstore ids of the k nearest chunks, straight from the FAISS index"""
+        vector = np.asarray([query_vector], dtype=np.float32)
+        _, positions = self.vectorstore.index.search(vector, k)
+        return [
+            self.vectorstore.index_to_docstore_id[position]
+            for position in positions[0]
+            if position != -1
+        ]
+
+    def corpus_fingerprint(self):
+        """Identify the indexed material and answering model for answer caching"""
+        keys = sorted(self.file_keys.values())
+        return IndexCache.make_key("\n".join(keys), model=self.model)
+
+    def _cached_answer(self, query_vector):
+        if self.answer_cache is None:
+            return None
+        return self.answer_cache.lookup(self.corpus_fingerprint(), query_vector)
+
+    def _cache_answer(self, query, query_vector, answer):
+        if self.answer_cache is not None and answer:
+            self.answer_cache.store(
+                self.corpus_fingerprint(), query, query_vector, answer
+            )
+
+    @tracing.traced("rag.prompt")
+    def _build_prompt(self, query, query_vector=None):
+        """Retrieve context for query and assemble the answer prompt"""
         # Get relevant documents - remove strict filtering
-        docs = self.retriever.get_relevant_documents(query)
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        docs = self.select_passages(query, query_vector)
         
-        # Group by file without aggressive filtering
+        # Group by file, keeping the passages that fit the token budget
         file_content = self._group_content_by_file(docs)
         
         # Get all unique file names
@@ -62,7 +648,7 @@ IMPORTANT RULES:
 
 4. Use numbered sections (1., 2., 3.) for main topics
 5. Use → for definitions
-6. Include specific page references like (p.4) when available
+6. Include page references like (p.4) taken from the [p.N] tags in the content
 7. Use bullet points for lists
 8. Cover the main concepts from each file
 9. If a file doesn't have specific information about the query, still include its main topics
@@ -73,112 +659,49 @@ CONTENT BY FILE:
 {self._format_file_content(file_content)}
 
 Create a comprehensive explanation covering the main content from each file. Include all files that have educational content:"""
+        self.last_usage["prompt_tokens"] = self.packer.count(prompt)
+        return prompt
 
-        try:
-            res = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,
-                max_tokens=2500,
-            )
-            return res.choices[0].message.content
-        except Exception as e:
-            return f"Error generating response: {str(e)}"
+    def _group_content_by_file(self, docs):
+        """Pack the most relevant passages into the token budget, grouped by file"""
+        passages = []
+        for doc in docs:
+            content = doc.page_content.strip()
+            if content:
+                page = doc.metadata.get("page")
+                file_name = doc.metadata.get("file_name", "Course Materials")
+                passages.append((file_name, f"[p.{page}] {content}" if page else content))
 
-    def _extract_all_file_markers(self, text):
-        """Extract all file markers from the raw text"""
-        file_markers = {}
-        lines = text.split('\n')
-        
-        for line in lines:
-            if "📚 FILE:" in line:
-                match = re.search(r'📚 FILE:\s*([^\n=]+)', line)
-                if match:
-                    file_name = match.group(1).strip()
-                    file_markers[file_name] = True
-            elif "--- FILE:" in line:
-                match = re.search(r'--- FILE:\s*([^\n=]+)\s*---', line)
-                if match:
-                    file_name = match.group(1).strip()
-                    file_markers[file_name] = True
-        
-        return file_markers
-
-    def _extract_file_name(self, text):
-        """Extract file name from text"""
-        # Look for file markers
-        patterns = [
-            r'📚 FILE:\s*([^\n=]+)',
-            r'--- FILE:\s*([^\n=]+)\s*---',
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, text)
-            if match:
-                filename = match.group(1).strip()
-                if len(filename) > 3:
-                    return filename
-        
-        # Fallback to known file markers
-        for known_file in self.file_markers.keys():
-            if known_file.lower() in text.lower():
-                return known_file
-        
-        return "Course Materials"
+        packed, tokens_used = self.packer.pack([text for _, text in passages])
+        self.last_usage["context_tokens"] = tokens_used
+        self.last_usage["passages"] = len(packed)
 
-    def _group_content_by_file(self, docs):
-        """Group document content by file names"""
         file_content = {}
-        
-        for doc in docs:
-            file_name = self._extract_file_name(doc.page_content)
-            if file_name not in file_content:
-                file_content[file_name] = []
-            
-            # Clean the content
-            clean_content = self._clean_content(doc.page_content)
-            if clean_content:
-                file_content[file_name].append(clean_content)
-        
+        for (file_name, _), text in zip(passages, packed):
+            file_content.setdefault(file_name, []).append(text)
         return file_content
 
     def _get_all_files_content(self):
-        """Fallback: get content from all files when no specific matches"""
+        """Fallback: share the token budget evenly across all files"""
+        files = list(self.corpus)
+        if not files:
+            return {}
+        share = self.packer.budget_tokens // len(files)
         file_content = {}
-        # Split the raw text by file markers
-        sections = re.split(r'📚 FILE:[^\n]+\n', self.raw_text)
-        file_markers = re.findall(r'📚 FILE:\s*([^\n]+)', self.raw_text)
-        
-        for i, marker in enumerate(file_markers):
-            if i < len(sections):
-                file_content[marker.strip()] = [sections[i]]
-        
+        tokens_used = 0
+        for corpus_file in files:
+            packed, used = self.packer.pack([corpus_file.text], budget_tokens=share)
+            if packed:
+                file_content[corpus_file.name] = packed
+                tokens_used += used
+        self.last_usage["context_tokens"] = tokens_used
+        self.last_usage["passages"] = len(file_content)
         return file_content
 
-    def _clean_content(self, text):
-        """Remove file headers and clean up content"""
-        patterns = [
-            r'📚 FILE:[^\n]+\n',
-            r'--- FILE:[^\n]+---',
-        ]
-        
-        clean_text = text
-        for pattern in patterns:
-            clean_text = re.sub(pattern, '', clean_text)
-        
-        return clean_text.strip()
-
     def _format_file_content(self, file_content):
         """Format file content for the prompt"""
         formatted = ""
         for file_name, contents in file_content.items():
             formatted += f"\n--- {file_name} ---\n"
-            # Combine content
-            combined_content = " ".join(contents)
-            # Limit length but ensure meaningful content
-            if len(combined_content) > 800:
-                preview = combined_content[:700] + "..."
-            else:
-                preview = combined_content
-            formatted += f"{preview}\n"
+            formatted += "\n".join(contents) + "\n"
         return formatted
\ No newline at end of file
@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import re
+import time
+import uuid
+
+import httpx
+
+DEFAULT_CASSETTE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "astralearn", "cassettes"
+)
+# "live" talks to the API, "record" also saves every response, "replay"
+# answers only from saved responses and never touches the network
+LLM_MODES = ("live", "record", "replay")
+
+
+def llm_mode():
+    mode = os.environ.get("ASTRALEARN_LLM_MODE", "live").lower()
+    if mode not in LLM_MODES:
+        raise ValueError(f"ASTRALEARN_LLM_MODE must be one of {LLM_MODES}, got {mode!r}")
+    return mode
+
+
+def request_key(method, path, body):
+    """Hash of a request with the prompt whitespace-normalized.
+
+    The API key and headers are left out, so a cassette recorded with one
+    key replays for any other.
+    """
+    payload = None
+    if body:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            payload = body.decode("utf-8", "replace")
+    if isinstance(payload, dict):
+        payload = dict(payload)
+        payload["messages"] = [
+            {**message, "content": re.sub(r"\s+", " ", str(message.get("content", ""))).strip()}
+            for message in payload.get("messages", [])
+        ]
+    normalized = json.dumps([method, path, payload], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+class CassetteStore:
+    """One JSON file per recorded response, named by request_key()"""
+
+    def __init__(self, cassette_dir=None):
+        self.cassette_dir = cassette_dir or os.environ.get(
+            "ASTRALEARN_CASSETTE_DIR", DEFAULT_CASSETTE_DIR
+        )
+        os.makedirs(self.cassette_dir, exist_ok=True)
+
+    def load(self, key):
+        try:
+            with open(self._path(key), encoding="utf-8") as handle:
+                return json.load(handle)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key, entry):
+        # Written aside and renamed so concurrent sessions never see half a file
+        tmp_path = os.path.join(self.cassette_dir, f".tmp-{uuid.uuid4().hex}")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as handle:
+                json.dump(entry, handle, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Could not write cassette {key[:12]}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def _path(self, key):
+        return os.path.join(self.cassette_dir, f"{key}.json")
+
+
+class _Cassettes:
+    """Record/replay logic shared by the sync and async transports"""
+
+    def __init__(self, mode, store):
+        self.mode = mode
+        self.store = store
+
+    def replay(self, request):
+        key = request_key(request.method, request.url.path, request.content)
+        entry = self.store.load(key)
+        if entry is None:
+            # A 404 surfaces as a clear API error instead of a silent network call
+            return httpx.Response(
+                404,
+                json={"error": {
+                    "message": f"No recorded response for request {key[:12]} "
+                               f"in {self.store.cassette_dir}",
+                    "type": "cassette_miss",
+                }},
+                request=request,
+            )
+        return self._response(entry, request)
+
+    def record(self, request, response, content, elapsed):
+        if response.status_code == 200:
+            key = request_key(request.method, request.url.path, request.content)
+            self.store.save(key, {
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "content_type": response.headers.get("content-type", "application/json"),
+                "body": content.decode("utf-8"),
+                "elapsed_ms": round(elapsed * 1000, 1),
+            })
+        headers = [
+            (name, value) for name, value in response.headers.multi_items()
+            # The body was already decoded while reading it
+            if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(
+            response.status_code, headers=headers, content=content, request=request
+        )
+
+    @staticmethod
+    def _response(entry, request):
+        return httpx.Response(
+            entry["status"],
+            headers={"content-type": entry["content_type"]},
+            content=entry["body"].encode("utf-8"),
+            request=request,
+        )
+
+
+class RecordReplayTransport(httpx.BaseTransport, _Cassettes):
+    """httpx transport that records API responses to, or replays them from, disk.
+
+    Streamed responses are recorded whole, so in record mode a stream only
+    arrives once it has finished.
+    """
+
+    def __init__(self, mode, transport, store=None):
+        _Cassettes.__init__(self, mode, store or CassetteStore())
+        self.transport = transport
+
+    def handle_request(self, request):
+        if self.mode == "replay":
+            return self.replay(request)
+        start = time.perf_counter()
+        response = self.transport.handle_request(request)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+        return self.record(request, response, content, time.perf_counter() - start)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRecordReplayTransport(httpx.AsyncBaseTransport, _Cassettes):
+    """Async counterpart of RecordReplayTransport"""
+
+    def __init__(self, mode, transport, store=None):
+        _Cassettes.__init__(self, mode, store or CassetteStore())
+        self.transport = transport
+
+    async def handle_async_request(self, request):
+        if self.mode == "replay":
+            return self.replay(request)
+        start = time.perf_counter()
+        response = await self.transport.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        return self.record(request, response, content, time.perf_counter() - start)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def wrap_transport(transport):
+    """Put transport behind record/replay when ASTRALEARN_LLM_MODE asks for it"""
+    mode = llm_mode()
+    if mode == "live":
+        return transport
+    if isinstance(transport, httpx.AsyncBaseTransport):
+        return AsyncRecordReplayTransport(mode, transport)
+    return RecordReplayTransport(mode, transport)
@@ -0,0 +1,107 @@
+import contextvars
+import threading
+from collections import deque
+
+from agents import tracing
+from agents.scheduler import BACKGROUND, JobPriority, current_priority, llm_context
+
+# Longest a caller waits on a running refill before generating its own batch
+REFILL_WAIT_SECONDS = 20
+
+
+class MCQPrefetcher:
+    """Keeps a few generated questions ready for one session.
+
+    generate_batch is called on a background thread and must return a list
+    of (question, choices, correct, explanation) tuples.
+    """
+
+    def __init__(self, generate_batch, target_size=3):
+        self.generate_batch = generate_batch
+        self.target_size = target_size
+        self._queue = deque()
+        self._lock = threading.Lock()
+        # Signalled when questions arrive or a refill ends
+        self._changed = threading.Condition(self._lock)
+        self._generation = 0
+        self._refilling = False
+        self._job = None
+
+    def get(self, wait=False):
+        """Pop a ready question and top the queue up in the background.
+
+        Returns None if none is ready; with wait, first waits up to
+        REFILL_WAIT_SECONDS for a refill that is already running, raising it
+        to the caller's priority. An empty queue starts no refill, since the
+        caller generates questions itself then.
+        """
+        with self._lock:
+            if wait and not self._queue and self._refilling:
+                # Otherwise the caller waits behind all BACKGROUND traffic
+                self._job.raise_to(current_priority())
+                self._changed.wait_for(
+                    lambda: self._queue or not self._refilling, REFILL_WAIT_SECONDS
+                )
+            if not self._queue:
+                return None
+            mcq = self._queue.popleft()
+        self.refill()
+        return mcq
+
+    def put_many(self, mcqs):
+        with self._lock:
+            self._queue.extend(mcqs)
+            self._changed.notify_all()
+
+    def reset(self):
+        """Discard queued questions, e.g. because the material changed"""
+        with self._lock:
+            self._generation += 1
+            self._queue.clear()
+
+    def refill(self):
+        """Start a background refill unless one is running or the queue is full"""
+        with self._lock:
+            if self._refilling or len(self._queue) >= self.target_size:
+                return
+            self._refilling = True
+            self._job = job = JobPriority(BACKGROUND)
+            generation = self._generation
+        # The caller's context carries its session to the scheduler
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._refill_worker, generation, job),
+            daemon=True,
+        ).start()
+
+    def size(self):
+        with self._lock:
+            return len(self._queue)
+
+    def _refill_worker(self, generation, job):
+        try:
+            # Spent on later questions, not on the request that started it
+            with llm_context(priority=job), tracing.detach_usage():
+                self._refill(generation)
+        except Exception as e:
+            print(f"Error prefetching MCQs: {e}")
+        finally:
+            with self._lock:
+                self._refilling = False
+                self._changed.notify_all()
+
+    def _refill(self, generation):
+        while True:
+            with self._lock:
+                if (generation != self._generation
+                        or len(self._queue) >= self.target_size):
+                    return
+            batch = self.generate_batch()
+            if not batch:
+                return
+            with self._lock:
+                # Questions for material that has since changed are stale
+                if generation != self._generation:
+                    return
+                self._queue.extend(batch)
+                self._changed.notify_all()
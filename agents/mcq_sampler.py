@@ -0,0 +1,121 @@
+import random
+import re
+import threading
+
+import numpy as np
+
+
+class CoverageSampler:
+    """Draws MCQ source passages from the RAG chunks, spreading coverage.
+
+    Chunks are stratified by file and page; each draw takes unused chunks
+    from the least covered files and pages, and a new coverage round starts
+    once everything has been used. Generated questions are remembered by
+    embedding so near-duplicates can be skipped.
+    """
+
+    def __init__(self, rag, passages_per_prompt=3, max_passage_chars=1200,
+                 duplicate_threshold=0.9):
+        self.rag = rag
+        self.passages_per_prompt = passages_per_prompt
+        self.max_passage_chars = max_passage_chars
+        self.duplicate_threshold = duplicate_threshold
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        # file name -> {page: [(doc id, text), ...]}
+        self._strata = {}
+        self._used = set()
+        self._question_vectors = []
+
+    def sample(self):
+        """Return a constant-size block of passages to write questions about"""
+        with self._lock:
+            self._sync()
+            if not self._strata:
+                return ""
+
+            if len(self._used) >= self._chunk_count():
+                # Everything has been tested once; start a new round
+                self._used = set()
+
+            picks = []
+            files = sorted(self._strata, key=self._file_coverage)
+            for file_name in files[:self.passages_per_prompt]:
+                pick = self._pick_from_file(file_name)
+                if pick:
+                    picks.append(pick)
+            # Fewer files than passages: take more from the least covered ones
+            while len(picks) < self.passages_per_prompt:
+                pick = None
+                for file_name in sorted(self._strata, key=self._file_coverage):
+                    pick = self._pick_from_file(file_name)
+                    if pick:
+                        break
+                if not pick:
+                    break
+                picks.append(pick)
+
+        sections = []
+        for file_name, page, text in picks:
+            page_label = f", p.{page}" if page else ""
+            sections.append(f"--- {file_name}{page_label} ---\n{text[:self.max_passage_chars]}")
+        return "\n\n".join(sections)
+
+    def is_duplicate(self, question):
+        """True if question is too close to one generated before; else remember it"""
+        vector = np.asarray(self.rag.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+        with self._lock:
+            if self._question_vectors:
+                scores = np.stack(self._question_vectors) @ vector
+                if float(scores.max()) >= self.duplicate_threshold:
+                    return True
+            self._question_vectors.append(vector)
+        return False
+
+    def _sync(self):
+        """Rebuild the strata when the indexed material has changed"""
+        fingerprint = self.rag.corpus_fingerprint()
+        if fingerprint == self._fingerprint:
+            return
+        self._fingerprint = fingerprint
+        self._strata = {}
+        self._used = set()
+        self._question_vectors = []
+
+        for file_name, docs in self.rag.get_file_chunks().items():
+            pages = {}
+            page = None
+            for doc_id, doc in docs:
+                page = doc.metadata.get("page") or self._first_page_marker(doc.page_content) or page
+                pages.setdefault(page, []).append((doc_id, doc.page_content))
+            if pages:
+                self._strata[file_name] = pages
+
+    def _pick_from_file(self, file_name):
+        pages = self._strata[file_name]
+        for page in sorted(pages, key=lambda p: self._page_coverage(pages[p])):
+            unused = [chunk for chunk in pages[page] if chunk[0] not in self._used]
+            if unused:
+                doc_id, text = random.choice(unused)
+                self._used.add(doc_id)
+                return file_name, page, text
+        return None
+
+    def _chunk_count(self):
+        return sum(len(chunks) for pages in self._strata.values() for chunks in pages.values())
+
+    def _file_coverage(self, file_name):
+        chunks = [chunk for chunks in self._strata[file_name].values() for chunk in chunks]
+        return self._page_coverage(chunks)
+
+    def _page_coverage(self, chunks):
+        used = sum(1 for doc_id, _ in chunks if doc_id in self._used)
+        return used / len(chunks)
+
+    @staticmethod
+    def _first_page_marker(text):
+        match = re.search(r'Page (\d+):', text)
+        return int(match.group(1)) if match else None
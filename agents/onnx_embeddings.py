@@ -0,0 +1,140 @@
+import inspect
+import os
+import shutil
+import uuid
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import onnxruntime
+except ImportError:  # optional backend; the default torch path needs none of this
+    onnxruntime = None
+
+DEFAULT_ONNX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "astralearn", "onnx")
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence-transformer embeddings run through int8-quantized ONNX Runtime.
+
+    The model is exported and dynamically quantized once, then reused from
+    cache_dir. Inputs are sorted by length before batching so each batch
+    pads to a similar length, and results are returned in input order.
+    """
+
+    def __init__(self, model_name, batch_size=None, threads=None, max_length=256,
+                 normalize=True, cache_dir=None):
+        if onnxruntime is None:
+            raise ImportError(
+                "The onnx embedding backend needs onnxruntime: pip install onnxruntime"
+            )
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.batch_size = batch_size or int(os.environ.get("ASTRALEARN_EMBED_BATCH", "64"))
+        threads = threads or int(os.environ.get("ASTRALEARN_EMBED_THREADS", "0"))
+        self.max_length = max_length
+        self.normalize = normalize
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+        model_path = self._quantized_model(
+            cache_dir or os.environ.get("ASTRALEARN_ONNX_DIR", DEFAULT_ONNX_DIR)
+        )
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 lets ONNX Runtime use one thread per physical core
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        # Longest first, so the slowest batch runs while threads are warm
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            encoded = self._encode([texts[i] for i in batch])
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), encoded.shape[1]), dtype=np.float32)
+            vectors[batch] = encoded
+        return vectors.tolist()
+
+    def embed_query(self, text):
+        return self._encode([text])[0].tolist()
+
+    def _encode(self, texts):
+        tokens = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_length,
+            return_tensors="np",
+        )
+        feed = {name: tokens[name].astype(np.int64) for name in self.input_names}
+        hidden = self.session.run(None, feed)[0]
+        # Mean pooling over real tokens, as sentence-transformers does
+        mask = tokens["attention_mask"][:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.normalize:
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+        return pooled.astype(np.float32)
+
+    def _quantized_model(self, cache_dir):
+        """Path of the int8 model, exporting and quantizing it on first use"""
+        model_dir = os.path.join(cache_dir, self.model_name.replace("/", "--"))
+        model_path = os.path.join(model_dir, "model_int8.onnx")
+        if os.path.exists(model_path):
+            return model_path
+
+        os.makedirs(model_dir, exist_ok=True)
+        tmp_dir = os.path.join(model_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp_dir)
+        try:
+            fp32_path = os.path.join(tmp_dir, "model.onnx")
+            int8_path = os.path.join(tmp_dir, "model_int8.onnx")
+            self._export(fp32_path)
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+            # Atomic publish so concurrent sessions never load a partial file
+            os.replace(int8_path, model_path)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        return model_path
+
+    def _export(self, path):
+        import torch
+        from transformers import AutoModel
+
+        model = AutoModel.from_pretrained(self.model_name).eval()
+        sample = self.tokenizer(["export sample"], return_tensors="pt")
+        names = list(sample.keys())
+
+        class Encoder(torch.nn.Module):
+            # Positional inputs in tokenizer order; forward() signatures vary by model
+            def __init__(self):
+                super().__init__()
+                self.model = model
+
+            def forward(self, *inputs):
+                return self.model(**dict(zip(names, inputs))).last_hidden_state
+
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+        extra = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            # Newer torch defaults to the dynamo exporter, which needs onnxscript
+            extra["dynamo"] = False
+        with torch.no_grad():
+            torch.onnx.export(
+                Encoder(),
+                tuple(sample[name] for name in names),
+                path,
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14,
+                **extra,
+            )
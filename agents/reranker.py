@@ -0,0 +1,60 @@
+import os
+import threading
+
+import numpy as np
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class CrossEncoderReranker:
+    """Re-scores retrieved chunks against the query with a small CPU cross-encoder.
+
+    Candidates are scored in retrieval order, one batch at a time; once top_n
+    of them clear score_threshold the remaining batches are skipped.
+    """
+
+    def __init__(self, model_name=DEFAULT_RERANK_MODEL, top_n=5, candidates=20,
+                 batch_size=8, score_threshold=None, max_length=512):
+        from sentence_transformers import CrossEncoder
+
+        self.model_name = model_name
+        self.top_n = top_n
+        # How many retrieved chunks are handed to the reranker
+        self.candidates = candidates
+        self.batch_size = batch_size
+        if score_threshold is None and os.environ.get("ASTRALEARN_RERANK_THRESHOLD"):
+            score_threshold = float(os.environ["ASTRALEARN_RERANK_THRESHOLD"])
+        self.score_threshold = score_threshold
+        self.model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+        # One model instance is shared by every session
+        self._lock = threading.Lock()
+
+    def score(self, query, texts):
+        """Cross-encoder relevance scores for (query, text) pairs"""
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+        with self._lock:
+            scores = self.model.predict(
+                [(query, text) for text in texts],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+        return np.asarray(scores, dtype=np.float32)
+
+    def rerank(self, query, docs, top_n=None):
+        """Return the top_n docs ordered by cross-encoder score"""
+        top_n = top_n or self.top_n
+        scored = []
+        confident = 0
+        for start in range(0, len(docs), self.batch_size):
+            batch = docs[start:start + self.batch_size]
+            scores = self.score(query, [doc.page_content for doc in batch])
+            scored.extend(zip(scores.tolist(), range(start, start + len(batch))))
+            if self.score_threshold is not None:
+                confident += int((scores >= self.score_threshold).sum())
+                # Enough strong passages already; later candidates ranked lower
+                if confident >= top_n:
+                    break
+
+        scored.sort(key=lambda item: (-item[0], item[1]))
+        return [docs[i] for _, i in scored[:top_n]]
@@ -0,0 +1,231 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import weakref
+from urllib.request import getproxies_environment, proxy_bypass_environment
+
+import httpx
+from groq import DEFAULT_MAX_RETRIES, AsyncGroq, AuthenticationError, Groq
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from agents.answer_cache import SemanticAnswerCache
+from agents.corpus_store import CorpusStore
+from agents.llm_transport import llm_mode, wrap_transport
+from agents.scheduler import AsyncSchedulingTransport, SchedulingTransport, schedule_transport
+from agents.onnx_embeddings import OnnxEmbeddings
+from agents.reranker import DEFAULT_RERANK_MODEL, CrossEncoderReranker
+from agents.summary_store import SummaryStore
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+# "torch" (sentence-transformers) or "onnx" (int8 ONNX Runtime)
+EMBEDDING_BACKEND = os.environ.get("ASTRALEARN_EMBEDDING_BACKEND", "torch")
+KEY_VALID_TTL = int(os.environ.get("ASTRALEARN_KEY_CACHE_TTL", "600"))
+KEY_INVALID_TTL = 30
+DEFAULT_GROQ_BASE_URL = "https://api.groq.com"
+
+_lock = threading.Lock()
+# Model loads take seconds; keep them from blocking client lookups
+_embeddings_lock = threading.Lock()
+_embeddings = {}
+_rerankers = {}
+_clients = {}
+# event loop -> {key hash: AsyncGroq}; async connections belong to one loop
+_async_clients = weakref.WeakKeyDictionary()
+_key_checks = {}
+_answer_cache = None
+_summary_store = None
+_corpus_store = None
+
+
+class LockedEmbeddings(Embeddings):
+    """Serializes bulk embedding into a model shared across sessions.
+
+    Queries skip the lock: inference is safe to run concurrently, and a
+    one-line query must not wait behind another session's whole corpus.
+    """
+
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        return self.embeddings.embed_query(text)
+
+
+def get_embeddings(model_name=DEFAULT_EMBEDDING_MODEL, backend=None):
+    """Return the process-wide embedding model for model_name on backend"""
+    backend = backend or EMBEDDING_BACKEND
+    with _embeddings_lock:
+        embeddings = _embeddings.get((model_name, backend))
+        if embeddings is None:
+            if backend == "onnx":
+                model = OnnxEmbeddings(model_name)
+            elif backend == "torch":
+                model = HuggingFaceEmbeddings(model_name=model_name)
+            else:
+                raise ValueError(f"Unknown embedding backend {backend!r}")
+            embeddings = LockedEmbeddings(model)
+            _embeddings[(model_name, backend)] = embeddings
+        return embeddings
+
+
+def get_reranker():
+    """Return the shared cross-encoder reranker, or None unless it is enabled"""
+    model_name = os.environ.get("ASTRALEARN_RERANKER", "0")
+    if model_name == "0":
+        return None
+    if model_name == "1":
+        model_name = DEFAULT_RERANK_MODEL
+    with _embeddings_lock:
+        reranker = _rerankers.get(model_name)
+        if reranker is None:
+            reranker = CrossEncoderReranker(model_name)
+            _rerankers[model_name] = reranker
+        return reranker
+
+
+def get_groq_client(api_key):
+    """Return one Groq client per API key, sharing a pooled HTTP connection"""
+    key_hash = _hash_key(api_key)
+    with _lock:
+        client = _clients.get(key_hash)
+        if client is None:
+            transport = httpx.HTTPTransport(
+                proxy=_env_proxy(),
+                limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+            )
+            transport = _llm_transport(transport)
+            http_client = httpx.Client(
+                transport=transport,
+                timeout=httpx.Timeout(60.0, connect=10.0),
+            )
+            client = Groq(
+                api_key=api_key, http_client=http_client,
+                max_retries=_max_retries(transport),
+            )
+            _clients[key_hash] = client
+        return client
+
+
+def get_async_groq_client(api_key):
+    """Return the AsyncGroq client for api_key on the running event loop"""
+    loop = asyncio.get_running_loop()
+    key_hash = _hash_key(api_key)
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key_hash)
+        if client is None:
+            transport = httpx.AsyncHTTPTransport(
+                proxy=_env_proxy(),
+                limits=httpx.Limits(max_connections=200, max_keepalive_connections=50),
+            )
+            transport = _llm_transport(transport)
+            http_client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(60.0, connect=10.0),
+            )
+            client = AsyncGroq(
+                api_key=api_key, http_client=http_client,
+                max_retries=_max_retries(transport),
+            )
+            clients[key_hash] = client
+        return client
+
+
+def _env_proxy():
+    """HTTP(S)_PROXY/ALL_PROXY for the Groq API, honoring NO_PROXY.
+
+    httpx ignores these once a client gets its own transport, so they are
+    read here the way httpx would read them.
+    """
+    url = httpx.URL(os.environ.get("GROQ_BASE_URL") or DEFAULT_GROQ_BASE_URL)
+    if proxy_bypass_environment(url.host):
+        return None
+    proxies = getproxies_environment()
+    return proxies.get(url.scheme) or proxies.get("all")
+
+
+def _llm_transport(transport):
+    """Record/replay and rate limiting around the HTTP transport of an LLM client"""
+    transport = wrap_transport(transport)
+    if llm_mode() == "replay":
+        # Nothing reaches the API, so there is no budget to respect
+        return transport
+    return schedule_transport(transport)
+
+
+def _max_retries(transport):
+    """No SDK retries behind the scheduler, which retries 429s after retry-after itself"""
+    if isinstance(transport, (SchedulingTransport, AsyncSchedulingTransport)):
+        return 0
+    return DEFAULT_MAX_RETRIES
+
+
+def validate_api_key(api_key):
+    """Check an API key against Groq, caching the verdict for a while"""
+    if llm_mode() == "replay":
+        # Replayed sessions never reach the API, so any key will do
+        return True
+    key_hash = _hash_key(api_key)
+    now = time.time()
+    with _lock:
+        cached = _key_checks.get(key_hash)
+    if cached and cached[1] > now:
+        return cached[0]
+
+    try:
+        # Listing models proves the key works without spending tokens
+        get_groq_client(api_key).models.list()
+        valid = True
+    except AuthenticationError as e:
+        print(f"API key validation error: {e}")
+        valid = False
+    except Exception as e:
+        # Network trouble says nothing about the key, so don't cache it
+        print(f"API key validation error: {e}")
+        return False
+
+    ttl = KEY_VALID_TTL if valid else KEY_INVALID_TTL
+    with _lock:
+        _key_checks[key_hash] = (valid, now + ttl)
+    return valid
+
+
+def get_answer_cache():
+    """Return the shared semantic answer cache, or None if it is disabled"""
+    global _answer_cache
+    if os.environ.get("ASTRALEARN_ANSWER_CACHE", "1") == "0":
+        return None
+    with _lock:
+        if _answer_cache is None:
+            _answer_cache = SemanticAnswerCache()
+        return _answer_cache
+
+
+def get_summary_store():
+    """Return the per-file summary store shared by all sessions"""
+    global _summary_store
+    with _lock:
+        if _summary_store is None:
+            _summary_store = SummaryStore()
+        return _summary_store
+
+
+def get_corpus_store():
+    """Return the store of parsed files and indexes shared by all sessions"""
+    global _corpus_store
+    with _lock:
+        if _corpus_store is None:
+            _corpus_store = CorpusStore()
+        return _corpus_store
+
+
+def _hash_key(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()
@@ -0,0 +1,184 @@
+import math
+import re
+
+import numpy as np
+
+# Keeps formula names, acronyms and section numbers like "3.2" intact
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-_][a-z0-9]+)*")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Sparse BM25 inverted index over chunk ids, kept next to FAISS.
+
+    Supports incremental add/remove so it follows the per-file updates of
+    the vector store; removed chunks are masked and compacted lazily.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.doc_ids = []
+        self._doc_lengths = []
+        self._active = []
+        self._positions = {}
+        # term -> ([position, ...], [term frequency, ...])
+        self._postings = {}
+        # term -> (positions array, tf array), rebuilt after changes
+        self._arrays = {}
+        self._length_array = None
+        self._active_count = 0
+
+    def __len__(self):
+        return self._active_count
+
+    def add(self, doc_ids, texts):
+        for doc_id, text in zip(doc_ids, texts):
+            if doc_id in self._positions:
+                continue
+            position = len(self.doc_ids)
+            self._positions[doc_id] = position
+            self.doc_ids.append(doc_id)
+            tokens = tokenize(text)
+            self._doc_lengths.append(len(tokens))
+            self._active.append(True)
+            self._active_count += 1
+
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, count in counts.items():
+                positions, frequencies = self._postings.setdefault(token, ([], []))
+                positions.append(position)
+                frequencies.append(count)
+        self._invalidate()
+
+    def remove(self, doc_ids):
+        for doc_id in doc_ids:
+            position = self._positions.pop(doc_id, None)
+            if position is not None and self._active[position]:
+                self._active[position] = False
+                self._active_count -= 1
+        self._invalidate()
+        if self._active_count < len(self.doc_ids) // 2:
+            self._compact()
+
+    def copy(self):
+        """Independent copy, for changing an index other sessions still search"""
+        other = BM25Index(self.k1, self.b)
+        other.doc_ids = list(self.doc_ids)
+        other._doc_lengths = list(self._doc_lengths)
+        other._active = list(self._active)
+        other._positions = dict(self._positions)
+        other._postings = {
+            term: (list(positions), list(frequencies))
+            for term, (positions, frequencies) in self._postings.items()
+        }
+        other._active_count = self._active_count
+        return other
+
+    def search(self, query, k):
+        """Return up to k (doc_id, score) pairs with a positive BM25 score"""
+        if not self._active_count:
+            return []
+        lengths = self._lengths()
+        active = lengths >= 0
+        avg_length = float(lengths[active].mean()) or 1.0
+        norms = self.k1 * (1 - self.b + self.b * np.maximum(lengths, 0) / avg_length)
+
+        scores = np.zeros(len(self.doc_ids), dtype=np.float32)
+        for term in set(tokenize(query)):
+            arrays = self._term_arrays(term)
+            if arrays is None:
+                continue
+            positions, frequencies = arrays
+            df = len(positions)
+            idf = math.log(1 + (self._active_count - df + 0.5) / (df + 0.5))
+            scores[positions] += idf * frequencies * (self.k1 + 1) / (
+                frequencies + norms[positions]
+            )
+        scores[~active] = 0
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.doc_ids[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def _term_arrays(self, term):
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            posting = self._postings.get(term)
+            if posting is None:
+                return None
+            positions = np.asarray(posting[0], dtype=np.int64)
+            frequencies = np.asarray(posting[1], dtype=np.float32)
+            keep = self._active_mask()[positions]
+            arrays = (positions[keep], frequencies[keep])
+            if not len(arrays[0]):
+                return None
+            self._arrays[term] = arrays
+        return arrays
+
+    def _lengths(self):
+        """Document lengths, with -1 marking removed chunks"""
+        if self._length_array is None:
+            lengths = np.asarray(self._doc_lengths, dtype=np.float32)
+            lengths[~self._active_mask()] = -1
+            self._length_array = lengths
+        return self._length_array
+
+    def _active_mask(self):
+        return np.asarray(self._active, dtype=bool)
+
+    def _invalidate(self):
+        self._arrays = {}
+        self._length_array = None
+
+    def _compact(self):
+        """Rebuild the postings without removed chunks"""
+        remap = {}
+        doc_ids = []
+        doc_lengths = []
+        for position, doc_id in enumerate(self.doc_ids):
+            if self._active[position]:
+                remap[position] = len(doc_ids)
+                doc_ids.append(doc_id)
+                doc_lengths.append(self._doc_lengths[position])
+
+        postings = {}
+        for term, (positions, frequencies) in self._postings.items():
+            kept = [(remap[p], f) for p, f in zip(positions, frequencies) if p in remap]
+            if kept:
+                postings[term] = ([p for p, _ in kept], [f for _, f in kept])
+
+        self.doc_ids = doc_ids
+        self._doc_lengths = doc_lengths
+        self._active = [True] * len(doc_ids)
+        self._positions = {doc_id: i for i, doc_id in enumerate(doc_ids)}
+        self._postings = postings
+        self._invalidate()
+
+
+def reciprocal_rank_fusion(ranked_lists, k=60, weights=None):
+    """Fuse ranked id lists with RRF, returning ids by descending fused score"""
+    weights = weights or [1.0] * len(ranked_lists)
+    # Filter the pairs together so each list keeps its own weight
+    pairs = [(ids, weight) for ids, weight in zip(ranked_lists, weights) if len(ids)]
+    if not pairs:
+        return []
+    ranked_lists = [ids for ids, _ in pairs]
+    weights = [weight for _, weight in pairs]
+
+    all_ids = np.concatenate([np.asarray(ids, dtype=object) for ids in ranked_lists])
+    contributions = np.concatenate([
+        weight / (k + np.arange(1, len(ids) + 1, dtype=np.float64))
+        for ids, weight in zip(ranked_lists, weights)
+    ])
+    unique_ids, inverse = np.unique(all_ids, return_inverse=True)
+    scores = np.zeros(len(unique_ids), dtype=np.float64)
+    np.add.at(scores, inverse, contributions)
+    order = np.argsort(-scores, kind="stable")
+    return [(unique_ids[i], float(scores[i])) for i in order]
@@ -0,0 +1,345 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import httpx
+
+from agents import tracing
+
+# Lower runs first: a student waiting on an answer beats prefetching
+INTERACTIVE, NORMAL, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", NORMAL: "normal", BACKGROUND: "background"}
+
+# Budgets per API key; 0 switches a budget off. The token budget follows
+# the limit the API reports in its x-ratelimit headers once it has one.
+REQUESTS_PER_MINUTE = int(os.environ.get("ASTRALEARN_GROQ_RPM", "30"))
+TOKENS_PER_MINUTE = int(os.environ.get("ASTRALEARN_GROQ_TPM", "6000"))
+MAX_RETRIES = int(os.environ.get("ASTRALEARN_GROQ_RETRIES", "4"))
+# Completions are charged at this many tokens up front; the API's
+# remaining-tokens header corrects the bucket afterwards
+EXPECTED_COMPLETION_TOKENS = 512
+CHARS_PER_TOKEN = 4
+# How often async waiters re-check the queue
+POLL_SECONDS = 0.02
+
+_session = ContextVar("llm_session", default=None)
+_priority = ContextVar("llm_priority", default=NORMAL)
+
+
+class JobPriority:
+    """Priority of a job shared by several callers, raised when one needs it sooner.
+
+    Pass it to llm_context() in place of a plain priority; raise_to() also
+    moves the job's calls that are already queued.
+    """
+
+    def __init__(self, value):
+        self.value = value
+        self._lock = threading.Lock()
+
+    def raise_to(self, priority):
+        with self._lock:
+            if priority >= self.value:
+                return
+            self.value = priority
+        _scheduler.reprioritize(self)
+
+
+def current_priority():
+    """Priority the LLM calls of the current context are queued at"""
+    priority = _priority.get()
+    return priority.value if isinstance(priority, JobPriority) else priority
+
+
+@contextmanager
+def llm_context(session=None, priority=None):
+    """Attribute the LLM calls made inside to a session and priority"""
+    tokens = []
+    if session is not None:
+        tokens.append((_session, _session.set(session)))
+    if priority is not None:
+        tokens.append((_priority, _priority.set(priority)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            try:
+                var.reset(token)
+            except ValueError:
+                # Closed from another context, e.g. an abandoned generator
+                pass
+
+
+class TokenBucket:
+    """per_minute units, refilled continuously"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        rate = self.capacity / 60
+        self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+    def wait_time(self, cost, now):
+        self.refill(now)
+        # A request larger than the whole bucket goes once the bucket is full
+        missing = min(cost, self.capacity) - self.level
+        return max(0.0, missing / (self.capacity / 60))
+
+    def take(self, cost):
+        self.level -= min(cost, self.capacity)
+
+    def sync(self, remaining, limit=None):
+        """Trust the API's own view of the budget"""
+        if limit:
+            self.capacity = float(limit)
+        self.level = min(self.level, float(remaining))
+
+
+class KeyScheduler:
+    """Request and token budgets of one API key, shared by every session.
+
+    Waiting calls are served by priority, then by start-time fair queueing
+    across sessions, so one session's burst cannot starve the others.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        rpm = REQUESTS_PER_MINUTE if requests_per_minute is None else requests_per_minute
+        tpm = TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.blocked_until = 0.0
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+        # session -> virtual finish time of its latest call
+        self._session_tags = {}
+        self._virtual_time = 0.0
+
+    def acquire(self, cost):
+        """Block until a call costing cost tokens may be sent"""
+        ticket = self._enqueue(cost)
+        with self._cond:
+            try:
+                while True:
+                    wait = self._try_admit(ticket)
+                    if wait == 0:
+                        return
+                    self._cond.wait(wait)
+            except BaseException:
+                self._cancel(ticket)
+                raise
+
+    async def acquire_async(self, cost):
+        """acquire() for coroutines: waits without blocking the event loop"""
+        ticket = self._enqueue(cost)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_admit(ticket)
+                if wait == 0:
+                    return
+                await asyncio.sleep(min(wait, 1.0) if wait else POLL_SECONDS)
+        except BaseException:
+            with self._cond:
+                self._cancel(ticket)
+            raise
+
+    def settle(self, response):
+        """Update the budgets from a response; seconds to back off after a 429, else None"""
+        headers = response.headers
+        with self._cond:
+            remaining = headers.get("x-ratelimit-remaining-tokens")
+            if self.tokens is not None and remaining:
+                try:
+                    self.tokens.sync(float(remaining), headers.get("x-ratelimit-limit-tokens"))
+                except ValueError:
+                    pass
+            if response.status_code != 429:
+                return None
+            retry_after = _parse_seconds(headers.get("retry-after")) or 1.0
+            # Every session on this key pauses, not just the one that hit it
+            self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+            return retry_after
+
+    def queued(self):
+        with self._cond:
+            return len(self._waiting)
+
+    def reprioritize(self, job):
+        """Move the queued calls of a JobPriority up to its current value"""
+        with self._cond:
+            changed = False
+            for ticket in self._waiting:
+                if ticket[4] is job and ticket[0] > job.value:
+                    ticket[0] = job.value
+                    changed = True
+            if changed:
+                heapq.heapify(self._waiting)
+                self._cond.notify_all()
+
+    def _enqueue(self, cost):
+        job = _priority.get()
+        session = _session.get()
+        if not isinstance(job, JobPriority):
+            job = None
+        with self._cond:
+            # Read under the lock so a concurrent raise_to() is not missed
+            priority = current_priority()
+            start = max(self._virtual_time, self._session_tags.get(session, 0.0))
+            self._session_tags[session] = start + 1
+            ticket = [priority, start, next(self._seq), cost, job]
+            heapq.heappush(self._waiting, ticket)
+            return ticket
+
+    def _try_admit(self, ticket):
+        """0 once ticket is admitted, seconds to wait, or None to wait for a turn"""
+        if self._waiting[0] is not ticket:
+            return None
+        now = time.monotonic()
+        wait = self.blocked_until - now
+        if self.requests is not None:
+            wait = max(wait, self.requests.wait_time(1, now))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.wait_time(ticket[3], now))
+        if wait > 0:
+            return wait
+
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(ticket[3])
+        heapq.heappop(self._waiting)
+        self._virtual_time = max(self._virtual_time, ticket[1])
+        if len(self._session_tags) > 1000:
+            # Sessions that are not ahead of the clock need no entry
+            self._session_tags = {
+                session: tag for session, tag in self._session_tags.items()
+                if tag > self._virtual_time
+            }
+        self._cond.notify_all()
+        return 0
+
+    def _cancel(self, ticket):
+        if ticket in self._waiting:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._cond.notify_all()
+
+
+class LLMScheduler:
+    """One KeyScheduler per API key, for the whole process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}
+
+    def for_request(self, request):
+        key_hash = hashlib.sha256(
+            request.headers.get("authorization", "").encode("utf-8")
+        ).hexdigest()
+        with self._lock:
+            scheduler = self._keys.get(key_hash)
+            if scheduler is None:
+                scheduler = self._keys[key_hash] = KeyScheduler()
+            return scheduler
+
+    def reprioritize(self, job):
+        with self._lock:
+            schedulers = list(self._keys.values())
+        for scheduler in schedulers:
+            scheduler.reprioritize(job)
+
+
+_scheduler = LLMScheduler()
+
+
+def estimate_tokens(body):
+    """Tokens a chat-completions request will probably use"""
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError:
+        return EXPECTED_COMPLETION_TOKENS
+    prompt_chars = sum(len(str(m.get("content", ""))) for m in payload.get("messages", []))
+    completion = min(payload.get("max_tokens") or EXPECTED_COMPLETION_TOKENS,
+                     EXPECTED_COMPLETION_TOKENS)
+    return prompt_chars // CHARS_PER_TOKEN + completion
+
+
+def _parse_seconds(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_completion(request):
+    return request.method == "POST" and request.url.path.endswith("/chat/completions")
+
+
+class SchedulingTransport(httpx.BaseTransport):
+    """Queues chat completions on their API key's budgets and retries 429s"""
+
+    def __init__(self, transport, scheduler=None):
+        self.transport = transport
+        self.scheduler = scheduler or _scheduler
+
+    def handle_request(self, request):
+        if not _is_completion(request):
+            return self.transport.handle_request(request)
+        budget = self.scheduler.for_request(request)
+        cost = estimate_tokens(request.content)
+        for attempt in range(MAX_RETRIES + 1):
+            with tracing.span("llm.queue", priority=PRIORITY_NAMES.get(current_priority())):
+                budget.acquire(cost)
+            response = self.transport.handle_request(request)
+            if budget.settle(response) is None or attempt == MAX_RETRIES:
+                return response
+            response.close()
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncSchedulingTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of SchedulingTransport"""
+
+    def __init__(self, transport, scheduler=None):
+        self.transport = transport
+        self.scheduler = scheduler or _scheduler
+
+    async def handle_async_request(self, request):
+        if not _is_completion(request):
+            return await self.transport.handle_async_request(request)
+        budget = self.scheduler.for_request(request)
+        cost = estimate_tokens(request.content)
+        for attempt in range(MAX_RETRIES + 1):
+            with tracing.span("llm.queue", priority=PRIORITY_NAMES.get(current_priority())):
+                await budget.acquire_async(cost)
+            response = await self.transport.handle_async_request(request)
+            if budget.settle(response) is None or attempt == MAX_RETRIES:
+                return response
+            await response.aclose()
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def schedule_transport(transport):
+    """Put transport behind the process-wide scheduler unless budgets are off"""
+    if not REQUESTS_PER_MINUTE and not TOKENS_PER_MINUTE:
+        return transport
+    if isinstance(transport, httpx.AsyncBaseTransport):
+        return AsyncSchedulingTransport(transport)
+    return SchedulingTransport(transport)
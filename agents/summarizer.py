@@ -1,12 +1,27 @@
-from groq import Groq
+from agents import tracing
+from agents.resources import get_async_groq_client, get_groq_client
+from agents.summary_store import FallbackSummary
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import contextvars
+import os
 import re
 
 
 class SummarizerAgent:
-    def __init__(self, api_key, model_name="llama-3.1-8b-instant"):
-        self.client = Groq(api_key=api_key)
+    def __init__(self, api_key, model_name="llama-3.1-8b-instant",
+                 max_workers=None, window_chars=12000):
+        self.api_key = api_key
+        self.client = get_groq_client(api_key)
         self.model = model_name
+        # Concurrent LLM calls per map-reduce summary
+        self.max_workers = max_workers or int(
+            os.environ.get("ASTRALEARN_SUMMARY_WORKERS", "4")
+        )
+        # Pages are grouped into windows of about this many characters
+        self.window_chars = window_chars
 
+    @tracing.traced("summarizer.summarize")
     def summarize(self, text):
         # Extract and clean file names properly
         file_sections = self._split_text_by_files(text)
@@ -14,6 +29,277 @@ class SummarizerAgent:
         if not file_sections:
             return "• No content found in the uploaded materials."
 
+        try:
+            res = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": self._build_prompt(file_sections)}],
+                temperature=0.3,  # Lower temperature for more consistent formatting
+                max_tokens=1500,
+            )
+
+            summary = res.choices[0].message.content
+            tracing.record_usage("summarizer", self.model, getattr(res, "usage", None))
+            
+            # Force bullet point formatting
+            return self._force_bullet_formatting(summary, file_sections)
+            
+        except Exception as e:
+            return self._create_forced_bullet_summary(file_sections)
+
+    @tracing.traced("summarizer.summarize")
+    async def asummarize(self, text):
+        """Async summarize() on the shared async client"""
+        file_sections = self._split_text_by_files(text)
+
+        if not file_sections:
+            return "• No content found in the uploaded materials."
+
+        try:
+            res = await get_async_groq_client(self.api_key).chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": self._build_prompt(file_sections)}],
+                temperature=0.3,
+                max_tokens=1500,
+            )
+            tracing.record_usage("summarizer", self.model, getattr(res, "usage", None))
+            return self._force_bullet_formatting(res.choices[0].message.content, file_sections)
+        except Exception as e:
+            return self._create_forced_bullet_summary(file_sections)
+
+    def summarize_map_reduce(self, text):
+        """Summarize every file in full using concurrent per-window calls"""
+        return "\n\n".join(self.iter_map_reduce(text))
+
+    def iter_map_reduce(self, text):
+        """Yield finished '📘 file' sections in file order as they complete.
+
+        Map: each page window of each file is summarized by its own call.
+        Reduce: a file with several windows gets its bullets merged.
+        """
+        file_sections = self._split_text_by_files(text)
+
+        if not file_sections:
+            yield "• No content found in the uploaded materials."
+            return
+
+        for summary in self._map_reduce_sections(file_sections):
+            yield summary
+
+    @tracing.traced("summarizer.file")
+    def summarize_file(self, corpus_file):
+        """Map-reduce summary section for one CorpusFile, or None if it is empty.
+
+        A FallbackSummary is returned if any LLM call failed.
+        """
+        if not corpus_file:
+            return None
+        section = {
+            'file_name': corpus_file.name,
+            'content': corpus_file.text,
+            'page_starts': corpus_file.page_starts,
+        }
+        return list(self._map_reduce_sections([section]))[0]
+
+    @tracing.traced("summarizer.file")
+    async def asummarize_file(self, corpus_file):
+        """Async summarize_file(): window calls run concurrently on the event loop"""
+        if not corpus_file:
+            return None
+        section = {
+            'file_name': corpus_file.name,
+            'content': corpus_file.text,
+            'page_starts': corpus_file.page_starts,
+        }
+        windows = self._split_windows(section['content'], section['page_starts'])
+        limit = asyncio.Semaphore(self.max_workers)
+
+        async def summarize_window(i, window):
+            async with limit:
+                return await self._asummarize_window(section['file_name'], window, i, len(windows))
+
+        results = await asyncio.gather(
+            *(summarize_window(i, window) for i, window in enumerate(windows))
+        )
+        bullets = [bullet for window_bullets, _ in results for bullet in window_bullets]
+        complete = all(window_complete for _, window_complete in results)
+        if len(windows) > 1 and len(bullets) > 8:
+            try:
+                with tracing.span("summarizer.merge"):
+                    res = await get_async_groq_client(self.api_key).chat.completions.create(
+                        **self._merge_request(section, bullets)
+                    )
+                    tracing.record_usage("summarizer", self.model, getattr(res, "usage", None))
+                bullets = self._extract_bullets(res.choices[0].message.content) or bullets
+            except Exception as e:
+                print(f"Error merging summary of {section['file_name']}: {e}")
+                complete = False
+        return self._file_summary(section, bullets, complete)
+
+    def _map_reduce_sections(self, file_sections):
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # All map tasks are queued before any reduce task, so a reduce
+            # never occupies a worker while its windows are still waiting
+            window_futures = []
+            for section in file_sections:
+                windows = self._split_windows(section['content'], section.get('page_starts'))
+                # Each task runs in a copy of this context so its spans nest
+                window_futures.append([
+                    executor.submit(contextvars.copy_context().run, self._summarize_window,
+                                    section['file_name'], window, i, len(windows))
+                    for i, window in enumerate(windows)
+                ])
+            reduce_futures = [
+                executor.submit(contextvars.copy_context().run, self._reduce_file,
+                                section, futures)
+                for section, futures in zip(file_sections, window_futures)
+            ]
+            for future in reduce_futures:
+                yield future.result()
+
+    def _split_windows(self, content, page_starts=None):
+        """Group a file's pages into windows of about window_chars characters"""
+        if page_starts:
+            # Page offsets from the corpus make re-parsing unnecessary
+            bounds = list(page_starts) + [len(content)]
+            pages = [content[bounds[i]:bounds[i + 1]] for i in range(len(page_starts))]
+        else:
+            pages = re.split(r'(?=Page \d+:)', content)
+        windows = []
+        current = ""
+        for page in pages:
+            if not page.strip():
+                continue
+            if current and len(current) + len(page) > self.window_chars:
+                windows.append(current)
+                current = ""
+            current += page
+            # A single oversized page still has to fit in one call
+            while len(current) > self.window_chars:
+                windows.append(current[:self.window_chars])
+                current = current[self.window_chars:]
+        if current.strip():
+            windows.append(current)
+        return windows
+
+    @tracing.traced("summarizer.window")
+    def _summarize_window(self, file_name, window, index, total):
+        """Map step: bullet points for one window of a file"""
+        try:
+            res = self.client.chat.completions.create(
+                **self._window_request(file_name, window, index, total)
+            )
+            content = res.choices[0].message.content
+            tracing.record_usage("summarizer", self.model, getattr(res, "usage", None))
+        except Exception as e:
+            print(f"Error summarizing {file_name} part {index + 1}: {e}")
+            content = None
+        return self._window_bullets(content, file_name, window)
+
+    @tracing.traced("summarizer.window")
+    async def _asummarize_window(self, file_name, window, index, total):
+        try:
+            res = await get_async_groq_client(self.api_key).chat.completions.create(
+                **self._window_request(file_name, window, index, total)
+            )
+            content = res.choices[0].message.content
+            tracing.record_usage("summarizer", self.model, getattr(res, "usage", None))
+        except Exception as e:
+            print(f"Error summarizing {file_name} part {index + 1}: {e}")
+            content = None
+        return self._window_bullets(content, file_name, window)
+
+    def _window_request(self, file_name, window, index, total):
+        prompt = f"""Summarize part {index + 1} of {total} of the file "{file_name}" as 3-6 bullet points.
+
+RULES:
+- Each bullet must start with • followed by a space
+- Keep each bullet point to 1 line
+- Include page references like (p.4) using the "Page N:" markers in the content
+- No headers, no numbers, no paragraphs
+
+CONTENT:
+{window}
+
+Bullet points:"""
+        return dict(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=400,
+        )
+
+    def _window_bullets(self, content, file_name, window):
+        """(bullets, complete): the response's bullets, or extracted ones if the call failed"""
+        bullets = self._extract_bullets(content)
+        if bullets:
+            return bullets, True
+        fallback = self._create_forced_bullet_summary(
+            [{'file_name': file_name, 'content': window}]
+        )
+        return self._extract_bullets(fallback), False
+
+    def _reduce_file(self, section, window_futures):
+        """Reduce step: merge a file's window bullets into one section"""
+        bullets = []
+        complete = True
+        for future in window_futures:
+            window_bullets, window_complete = future.result()
+            bullets.extend(window_bullets)
+            complete = complete and window_complete
+
+        if len(window_futures) > 1 and len(bullets) > 8:
+            try:
+                with tracing.span("summarizer.merge"):
+                    res = self.client.chat.completions.create(
+                        **self._merge_request(section, bullets)
+                    )
+                    tracing.record_usage("summarizer", self.model, getattr(res, "usage", None))
+                merged = self._extract_bullets(res.choices[0].message.content)
+                if merged:
+                    bullets = merged
+            except Exception as e:
+                print(f"Error merging summary of {section['file_name']}: {e}")
+                complete = False
+
+        return self._file_summary(section, bullets, complete)
+
+    @staticmethod
+    def _file_summary(section, bullets, complete):
+        summary = '\n'.join([f"📘 {section['file_name']}"] + bullets[:8])
+        return summary if complete else FallbackSummary(summary)
+
+    def _merge_request(self, section, bullets):
+        """Chat completion arguments that merge a file's window bullets"""
+        prompt = f"""Merge these bullet points from "{section['file_name']}" into 6-8 bullet points that cover the whole file.
+
+RULES:
+- Each bullet must start with • followed by a space
+- Keep each bullet point to 1 line
+- Keep the page references like (p.4)
+- No headers, no numbers, no paragraphs
+
+BULLET POINTS:
+{chr(10).join(bullets)}
+
+Merged bullet points:"""
+        return dict(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.3,
+            max_tokens=600,
+        )
+
+    def _extract_bullets(self, text):
+        """Keep only the bullet lines of a model response"""
+        bullets = []
+        for line in (text or '').split('\n'):
+            cleaned = self._clean_summary_line(line)
+            if cleaned and cleaned.startswith('•'):
+                bullets.append(cleaned)
+        return bullets
+
+    def _build_prompt(self, file_sections):
+        """Assemble the bullet summary prompt for the given file sections"""
         prompt = f"""CRITICAL: You MUST format the response EXACTLY as shown below. Use ONLY bullet points (•) and file headers (📘).
 
 EXAMPLE FORMAT:
@@ -42,23 +328,9 @@ CONTENT:
 {self._format_file_sections(file_sections)}
 
 Now create the summary following EXACTLY the format above. Use ONLY bullet points:"""
+        return prompt
 
-        try:
-            res = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.3,  # Lower temperature for more consistent formatting
-                max_tokens=1500,
-            )
-
-            summary = res.choices[0].message.content
-            
-            # Force bullet point formatting
-            return self._force_bullet_formatting(summary, file_sections)
-            
-        except Exception as e:
-            return self._create_forced_bullet_summary(file_sections)
-
+    @tracing.traced("summarizer.split_files")
     def _split_text_by_files(self, text):
         """Split text into sections by file markers and remove duplicates"""
         file_sections = []
@@ -130,6 +402,7 @@ Now create the summary following EXACTLY the format above. Use ONLY bullet point
             formatted += f"{content}\n"
         return formatted
 
+    @tracing.traced("summarizer.format")
     def _force_bullet_formatting(self, summary, file_sections):
         """Force bullet point formatting by completely rewriting if needed"""
         if not summary:
@@ -144,20 +417,27 @@ Now create the summary following EXACTLY the format above. Use ONLY bullet point
             # Clean up existing bullet format
             cleaned_lines = []
             for line in lines:
-                line = line.strip()
-                if line.startswith('📘'):
-                    cleaned_lines.append(line)
-                elif line.startswith('•'):
-                    cleaned_lines.append(line)
-                elif line and not line.startswith(('1.', '2.', '3.', '4.', '5.', '6.', '-', 'EXAMPLE', 'RULES:')):
-                    # Convert non-bullet lines to bullets
-                    cleaned_lines.append(f"• {line}")
+                cleaned = self._clean_summary_line(line)
+                if cleaned:
+                    cleaned_lines.append(cleaned)
             
             return '\n'.join(cleaned_lines)
         else:
             # Completely rewrite the summary
             return self._create_forced_bullet_summary(file_sections)
 
+    def _clean_summary_line(self, line):
+        """Normalize one summary line to a header or bullet, or drop it"""
+        line = line.strip()
+        if line.startswith('📘'):
+            return line
+        elif line.startswith('•'):
+            return line
+        elif line and not line.startswith(('1.', '2.', '3.', '4.', '5.', '6.', '-', 'EXAMPLE', 'RULES:')):
+            # Convert non-bullet lines to bullets
+            return f"• {line}"
+        return None
+
     def _create_forced_bullet_summary(self, file_sections):
         """Create a bullet-point summary by force if AI doesn't comply"""
         summary_lines = []
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from agents import tracing
+from agents.scheduler import BACKGROUND, JobPriority, current_priority, llm_context
+
+
+class FallbackSummary(str):
+    """A summary section built without some of its LLM responses.
+
+    Served to whoever is waiting for it but never stored, so the next
+    request tries the LLM again.
+    """
+
+
+class SummaryStore:
+    """Per-file summaries keyed by content hash, computed in the background.
+
+    Shared by all sessions: a file that any session has uploaded before is
+    summarized once, and concurrent requests for it wait on the same job.
+    """
+
+    def __init__(self, max_entries=500, max_workers=2):
+        self.max_entries = max_entries
+        self._results = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="summary"
+        )
+
+    def prefetch(self, corpus_file, summarizer):
+        """Start summarizing a CorpusFile in the background unless already known"""
+        key = self._key(corpus_file, summarizer)
+        with self._lock:
+            if key in self._results:
+                return None
+            job = self._pending.get(key)
+            if job is None:
+                job = self._pending[key] = (Future(), JobPriority(BACKGROUND))
+                # The caller's context carries its session to the scheduler
+                self._executor.submit(
+                    contextvars.copy_context().run,
+                    self._run, key, job, corpus_file, summarizer,
+                )
+            return job[0]
+
+    def get(self, corpus_file, summarizer):
+        """Return the summary section for a file, waiting if it is in progress.
+
+        The wait runs at the caller's priority: a background job it joins is
+        raised to it, or summarized right here if no worker has started it.
+        """
+        key = self._key(corpus_file, summarizer)
+        job = self._join(key)
+        if not isinstance(job, tuple):
+            return job
+        future, priority = job
+        if not self._claim(future):
+            return future.result()
+        try:
+            with llm_context(priority=priority):
+                summary = summarizer.summarize_file(corpus_file)
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        return self._finish(key, future, summary)
+
+    async def aget(self, corpus_file, summarizer):
+        """Async get(): awaits a job in progress, or summarizes on the event loop"""
+        key = self._key(corpus_file, summarizer)
+        job = self._join(key)
+        if not isinstance(job, tuple):
+            return job
+        future, priority = job
+        if not self._claim(future):
+            return await asyncio.wrap_future(future)
+        try:
+            with llm_context(priority=priority):
+                summary = await summarizer.asummarize_file(corpus_file)
+        except BaseException as e:
+            self._fail(key, future, e)
+            raise
+        return self._finish(key, future, summary)
+
+    def _join(self, key):
+        """The stored summary, or the (future, priority) job to wait on"""
+        priority = current_priority()
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+            job = self._pending.get(key)
+            if job is None:
+                job = self._pending[key] = (Future(), JobPriority(priority))
+        job[1].raise_to(priority)
+        return job
+
+    def _claim(self, future):
+        """True if the caller gets to run the job, False if someone already is"""
+        with self._lock:
+            if future.running() or future.done():
+                return False
+            return future.set_running_or_notify_cancel()
+
+    def _run(self, key, job, corpus_file, summarizer):
+        future, priority = job
+        # A caller that needed the summary first may have taken the job over
+        if not self._claim(future):
+            return
+        try:
+            with llm_context(priority=priority), tracing.detach_usage():
+                summary = summarizer.summarize_file(corpus_file)
+        except Exception as e:
+            self._fail(key, future, e)
+            print(f"Error summarizing {corpus_file.name}: {e}")
+            return
+        self._finish(key, future, summary)
+
+    def _finish(self, key, future, summary):
+        self._store(key, summary)
+        future.set_result(summary)
+        return summary
+
+    def _fail(self, key, future, error):
+        with self._lock:
+            self._pending.pop(key, None)
+        future.set_exception(error)
+
+    def _store(self, key, summary):
+        with self._lock:
+            self._pending.pop(key, None)
+            if isinstance(summary, FallbackSummary):
+                return
+            self._results[key] = summary
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+    @staticmethod
+    def _key(corpus_file, summarizer):
+        # CorpusFile.key already hashes the file name and content
+        return hashlib.sha256(
+            f"{summarizer.model}\n{corpus_file.key}".encode("utf-8")
+        ).hexdigest()
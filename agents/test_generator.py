@@ -1,17 +1,125 @@
-from groq import Groq
+from agents import tracing
+from agents.resources import get_async_groq_client, get_groq_client
+import json
 import re
 
 
 class TestGeneratorAgent:
     def __init__(self, api_key, model_name="llama-3.1-8b-instant"):
-        self.client = Groq(api_key=api_key)
+        self.api_key = api_key
+        self.client = get_groq_client(api_key)
         self.model = model_name
 
-    def generate_single_mcq(self, text):
+    @tracing.traced("mcq.batch")
+    def generate_mcq_batch(self, text, count=3):
+        """Generate several MCQs in one call, returning only well-formed ones"""
+        try:
+            response = self.client.chat.completions.create(**self._batch_request(text, count))
+            tracing.record_usage("mcq", self.model, getattr(response, "usage", None))
+            data = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"Error generating MCQ batch: {e}")
+            return []
+        return self._parse_batch(data)
+
+    @tracing.traced("mcq.batch")
+    async def agenerate_mcq_batch(self, text, count=3):
+        """Async generate_mcq_batch() on the shared async client"""
+        try:
+            client = get_async_groq_client(self.api_key)
+            response = await client.chat.completions.create(**self._batch_request(text, count))
+            tracing.record_usage("mcq", self.model, getattr(response, "usage", None))
+            data = json.loads(response.choices[0].message.content)
+        except Exception as e:
+            print(f"Error generating MCQ batch: {e}")
+            return []
+        return self._parse_batch(data)
+
+    def _batch_request(self, text, count):
+        """Chat completion arguments for a JSON batch of count MCQs"""
+        text = self._trim_material(text)
+
+        prompt = f"""
+Create {count} different multiple-choice questions based on the provided material from ALL files/chapters.
+
+IMPORTANT RULES:
+- Every question has exactly 4 choices
+- Make sure all choices are plausible but only one is correct
+- Base everything strictly on the provided material
+- Cover different concepts; do not repeat a question
+- Keep each explanation concise (2-3 lines)
+
+MATERIAL:
+{text}
+
+Respond with JSON only, in exactly this shape:
+{{"questions": [{{"question": "...?", "choices": ["...", "...", "...", "..."], "correct": "A", "explanation": "..."}}]}}
+"""
+
+        return dict(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=400 * count,
+            response_format={"type": "json_object"},
+        )
+
+    def _parse_batch(self, data):
+        items = data.get("questions", []) if isinstance(data, dict) else []
+        mcqs = []
+        for item in items:
+            mcq = self._validate_mcq(item)
+            if mcq:
+                mcqs.append(mcq)
+        return mcqs
+
+    def _validate_mcq(self, item):
+        """Turn one JSON question into a (question, choices, correct, explanation) tuple"""
+        if not isinstance(item, dict):
+            return None
+        question = str(item.get("question", "")).strip()
+        choices = item.get("choices")
+        correct = str(item.get("correct", "")).strip().upper()[:1]
+        explanation = str(item.get("explanation", "")).strip()
+
+        if not question or not isinstance(choices, list) or len(choices) != 4:
+            return None
+        choices = [re.sub(r"^[A-D][).:]\s*", "", str(choice)).strip() for choice in choices]
+        if not all(choices) or len(set(choices)) != 4 or not correct or correct not in "ABCD":
+            return None
+        return question, choices, correct, explanation
+
+    def _trim_material(self, text):
         # Use a reasonable chunk if text is too long, but don't truncate important content
         if len(text) > 6000:
             # Take beginning and end to capture content from all files
             text = text[:3000] + "\n...[content continues]...\n" + text[-3000:]
+        return text
+
+    @tracing.traced("mcq.single")
+    def generate_single_mcq(self, text):
+        try:
+            response = self.client.chat.completions.create(**self._single_request(text))
+            tracing.record_usage("mcq", self.model, getattr(response, "usage", None))
+            return self._parse_single(response.choices[0].message.content)
+        except Exception as e:
+            print(f"Error generating MCQ: {e}")
+            return self._fallback_mcq()
+
+    @tracing.traced("mcq.single")
+    async def agenerate_single_mcq(self, text):
+        """Async generate_single_mcq() on the shared async client"""
+        try:
+            client = get_async_groq_client(self.api_key)
+            response = await client.chat.completions.create(**self._single_request(text))
+            tracing.record_usage("mcq", self.model, getattr(response, "usage", None))
+            return self._parse_single(response.choices[0].message.content)
+        except Exception as e:
+            print(f"Error generating MCQ: {e}")
+            return self._fallback_mcq()
+
+    def _single_request(self, text):
+        text = self._trim_material(text)
 
         prompt = f"""
 Create ONE multiple-choice question based on the provided material from ALL files/chapters.
@@ -37,59 +145,57 @@ CORRECT: [A/B/C/D]
 EXPLANATION: [Brief explanation here in 2-3 lines]
 """
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=500,
-            )
-
-            res = response.choices[0].message.content
-
-            # Debug: Print raw response
-            print("RAW MCQ RESPONSE:", res)
-
-            # Parse with more robust regex
-            question_match = re.search(
-                r"QUESTION:\s*(.+?)(?=\n[A-D]\)|\nCORRECT:|\nEXPLANATION:|\Z)",
-                res,
-                re.DOTALL,
-            )
-            choices = re.findall(r"^[A-D]\)\s*(.+)$", res, re.MULTILINE)
-            correct_match = re.search(r"CORRECT:\s*([A-D])", res)
-            explanation_match = re.search(
-                r"EXPLANATION:\s*(.+?)(?=\n[A-D]\)|\nQUESTION:|\Z)", res, re.DOTALL
-            )
-
-            question = (
-                question_match.group(1).strip()
-                if question_match
-                else "What is a key concept discussed across the material?"
-            )
-            choices = (
-                choices
-                if choices
-                else ["Concept A", "Concept B", "Concept C", "Concept D"]
-            )
-            correct = correct_match.group(1) if correct_match else "A"
-            explanation = (
-                explanation_match.group(1).strip()
-                if explanation_match
-                else "This tests your understanding of key concepts from the provided material."
-            )
-
-            # Ensure we have exactly 4 choices
-            while len(choices) < 4:
-                choices.append(f"Option {chr(68 - len(choices))}")
-
-            return question, choices[:4], correct, explanation
+        return dict(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.7,
+            max_tokens=500,
+        )
 
-        except Exception as e:
-            print(f"Error generating MCQ: {e}")
-            return (
-                "What is a key concept discussed across all the provided material?",
-                ["Concept A", "Concept B", "Concept C", "Concept D"],
-                "A",
-                "Review the material to understand the key concepts discussed across all files.",
-            )
+    @tracing.traced("mcq.parse")
+    def _parse_single(self, res):
+        # Debug: Print raw response
+        print("RAW MCQ RESPONSE:", res)
+
+        # Parse with more robust regex
+        question_match = re.search(
+            r"QUESTION:\s*(.+?)(?=\n[A-D]\)|\nCORRECT:|\nEXPLANATION:|\Z)",
+            res,
+            re.DOTALL,
+        )
+        choices = re.findall(r"^[A-D]\)\s*(.+)$", res, re.MULTILINE)
+        correct_match = re.search(r"CORRECT:\s*([A-D])", res)
+        explanation_match = re.search(
+            r"EXPLANATION:\s*(.+?)(?=\n[A-D]\)|\nQUESTION:|\Z)", res, re.DOTALL
+        )
+
+        question = (
+            question_match.group(1).strip()
+            if question_match
+            else "What is a key concept discussed across the material?"
+        )
+        choices = (
+            choices
+            if choices
+            else ["Concept A", "Concept B", "Concept C", "Concept D"]
+        )
+        correct = correct_match.group(1) if correct_match else "A"
+        explanation = (
+            explanation_match.group(1).strip()
+            if explanation_match
+            else "This tests your understanding of key concepts from the provided material."
+        )
+
+        # Ensure we have exactly 4 choices
+        while len(choices) < 4:
+            choices.append(f"Option {chr(68 - len(choices))}")
+
+        return question, choices[:4], correct, explanation
+
+    def _fallback_mcq(self):
+        return (
+            "What is a key concept discussed across all the provided material?",
+            ["Concept A", "Concept B", "Concept C", "Concept D"],
+            "A",
+            "Review the material to understand the key concepts discussed across all files.",
+        )
@@ -0,0 +1,363 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TRACE_FILE = os.environ.get("ASTRALEARN_TRACE_FILE")
+METRICS_PORT = int(os.environ.get("ASTRALEARN_METRICS_PORT", "0"))
+# Upper bounds of the span duration histogram, in milliseconds
+BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# Checked first thing by span(), so a disabled tracer costs one global lookup
+_enabled = (
+    os.environ.get("ASTRALEARN_TRACE", "0") == "1" or bool(TRACE_FILE) or bool(METRICS_PORT)
+)
+_current = ContextVar("astralearn_span", default=None)
+_usage = ContextVar("astralearn_usage", default=None)
+_metrics_server = None
+_server_lock = threading.Lock()
+
+
+class Span:
+    """A timed stage; nested spans share their root's trace id"""
+
+    __slots__ = ("name", "attrs", "trace_id", "span_id", "parent_id",
+                 "start", "duration_ms", "_t0", "_token")
+
+    def __init__(self, name, attrs):
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, name, value):
+        self.attrs[name] = self.attrs.get(name, 0) + value
+
+    def __enter__(self):
+        parent = _current.get()
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.span_id = uuid.uuid4().hex[:8]
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self._t0) * 1000
+        if exc_type is not None and exc_type is not GeneratorExit:
+            self.attrs["error"] = exc_type.__name__
+        try:
+            _current.reset(self._token)
+        except ValueError:
+            # Closed from another context, e.g. an abandoned generator
+            pass
+        _tracer.finish(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": round(self.duration_ms, 3),
+            "thread": threading.current_thread().name,
+            **self.attrs,
+        }
+
+
+class _NoopSpan:
+    def set(self, **attrs):
+        pass
+
+    def add(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+class Tracer:
+    """Keeps recent spans, duration histograms and token counters.
+
+    Finished spans are also appended to trace_file as JSON lines.
+    """
+
+    def __init__(self, max_spans=5000, trace_file=None):
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        # span name -> [bucket counts..., +Inf count, sum ms]
+        self._durations = {}
+        # (agent, model, kind) -> tokens, as reported by the API
+        self._tokens = {}
+        # Same, for calls whose response carried no usage and were counted locally
+        self._estimated_tokens = {}
+        self._file = None
+        if trace_file:
+            self._file = open(trace_file, "a", encoding="utf-8")
+
+    def finish(self, span):
+        record = span.to_dict()
+        with self._lock:
+            self._spans.append(record)
+            histogram = self._durations.get(span.name)
+            if histogram is None:
+                histogram = self._durations[span.name] = [0] * (len(BUCKETS_MS) + 2)
+            for i, bound in enumerate(BUCKETS_MS):
+                if span.duration_ms <= bound:
+                    histogram[i] += 1
+            histogram[-2] += 1
+            histogram[-1] += span.duration_ms
+            if self._file is not None:
+                self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+                self._file.flush()
+
+    def add_tokens(self, agent, model, prompt_tokens, completion_tokens, estimated=False):
+        totals = self._estimated_tokens if estimated else self._tokens
+        with self._lock:
+            for kind, count in (("prompt", prompt_tokens), ("completion", completion_tokens)):
+                key = (agent, model, kind)
+                totals[key] = totals.get(key, 0) + count
+
+    def token_totals(self):
+        with self._lock:
+            return dict(self._tokens)
+
+    def recent_traces(self, limit=20):
+        """The newest traces, each as [(depth, span), ...] in start order"""
+        with self._lock:
+            spans = list(self._spans)
+        traces = {}
+        for record in spans:
+            traces.setdefault(record["trace_id"], []).append(record)
+        newest = sorted(traces.values(), key=lambda t: max(s["start"] for s in t), reverse=True)
+
+        result = []
+        for trace in newest[:limit]:
+            children = {}
+            for record in trace:
+                children.setdefault(record["parent_id"], []).append(record)
+            ids = {record["span_id"] for record in trace}
+            # Roots, plus spans whose parent already fell out of the buffer
+            roots = [r for r in trace if r["parent_id"] is None or r["parent_id"] not in ids]
+            rows = []
+
+            def walk(record, depth):
+                rows.append((depth, record))
+                for child in sorted(children.get(record["span_id"], []), key=lambda s: s["start"]):
+                    walk(child, depth + 1)
+
+            for root in sorted(roots, key=lambda s: s["start"]):
+                walk(root, 0)
+            result.append(rows)
+        return result
+
+    def prometheus_text(self):
+        """Span durations and token counts in the Prometheus text format"""
+        with self._lock:
+            durations = {name: list(h) for name, h in self._durations.items()}
+            tokens = dict(self._tokens)
+            estimated_tokens = dict(self._estimated_tokens)
+        lines = [
+            "# HELP astralearn_span_duration_seconds Time spent in each pipeline stage",
+            "# TYPE astralearn_span_duration_seconds histogram",
+        ]
+        for name in sorted(durations):
+            histogram = durations[name]
+            for bound, count in zip(BUCKETS_MS, histogram):
+                lines.append(
+                    f'astralearn_span_duration_seconds_bucket{{span="{name}",le="{bound / 1000:g}"}} {count}'
+                )
+            lines.append(f'astralearn_span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {histogram[-2]}')
+            lines.append(f'astralearn_span_duration_seconds_sum{{span="{name}"}} {histogram[-1] / 1000:.6f}')
+            lines.append(f'astralearn_span_duration_seconds_count{{span="{name}"}} {histogram[-2]}')
+        lines += [
+            "# HELP astralearn_llm_tokens_total Tokens reported by the LLM API",
+            "# TYPE astralearn_llm_tokens_total counter",
+        ]
+        for (agent, model, kind), count in sorted(tokens.items()):
+            lines.append(
+                f'astralearn_llm_tokens_total{{agent="{agent}",model="{model}",kind="{kind}"}} {count}'
+            )
+        if estimated_tokens:
+            lines += [
+                "# HELP astralearn_llm_estimated_tokens_total Tokens counted locally when a response carried no usage",
+                "# TYPE astralearn_llm_estimated_tokens_total counter",
+            ]
+            for (agent, model, kind), count in sorted(estimated_tokens.items()):
+                lines.append(
+                    f'astralearn_llm_estimated_tokens_total{{agent="{agent}",model="{model}",kind="{kind}"}} {count}'
+                )
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+            self._durations = {}
+            self._tokens = {}
+            self._estimated_tokens = {}
+
+
+_tracer = Tracer(trace_file=TRACE_FILE)
+
+
+def get_tracer():
+    return _tracer
+
+
+def enabled():
+    return _enabled
+
+
+def set_enabled(value):
+    global _enabled
+    _enabled = bool(value)
+
+
+def span(name, **attrs):
+    """Context manager timing one stage; a shared no-op when tracing is off"""
+    if not _enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def current_span():
+    return _current.get() if _enabled else _NOOP
+
+
+def traced(name):
+    """Decorator wrapping a function, coroutine or generator in a span"""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return await func(*args, **kwargs)
+                with Span(name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return (yield from func(*args, **kwargs))
+                with Span(name, {}):
+                    return (yield from func(*args, **kwargs))
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            with Span(name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+@contextmanager
+def count_usage():
+    """Collect the token usage recorded inside, even with tracing off.
+
+    Yields a dict of prompt_tokens/completion_tokens; threads started inside
+    with a copy of the context add to it too. estimated_tokens holds counts
+    made locally when a response carried no usage.
+    """
+    totals = {"prompt_tokens": 0, "completion_tokens": 0, "estimated_tokens": 0}
+    token = _usage.set((threading.Lock(), totals))
+    try:
+        yield totals
+    finally:
+        _usage.reset(token)
+
+
+@contextmanager
+def detach_usage():
+    """Keep background work started by a request out of its count_usage()"""
+    token = _usage.set(None)
+    try:
+        yield
+    finally:
+        _usage.reset(token)
+
+
+def record_usage(agent, model, usage, estimated=False):
+    """Count the prompt/completion tokens of an API response (usage object or dict).
+
+    estimated marks counts made locally; they go to a separate metric.
+    """
+    if usage is None or (not _enabled and _usage.get() is None):
+        return
+    if isinstance(usage, dict):
+        prompt_tokens = usage.get("prompt_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or 0
+    else:
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    counter = _usage.get()
+    if counter is not None:
+        lock, totals = counter
+        with lock:
+            if estimated:
+                totals["estimated_tokens"] += prompt_tokens + completion_tokens
+            else:
+                totals["prompt_tokens"] += prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+    if not _enabled:
+        return
+    _tracer.add_tokens(agent, model, prompt_tokens, completion_tokens, estimated)
+    current = _current.get()
+    if current is not None:
+        current.add("prompt_tokens", prompt_tokens)
+        current.add("completion_tokens", completion_tokens)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        data = _tracer.prometheus_text().encode("utf-8")
+        self.send_response(200)
+        self.send_header("content-type", "text/plain; version=0.0.4")
+        self.send_header("content-length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port=None):
+    """Expose /metrics on port (default ASTRALEARN_METRICS_PORT) once per process"""
+    global _metrics_server
+    port = port or METRICS_PORT
+    if not port:
+        return None
+    with _server_lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer(("0.0.0.0", port), _MetricsHandler)
+            except OSError as e:
+                print(f"Could not serve metrics on port {port}: {e}")
+                return None
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+        return _metrics_server
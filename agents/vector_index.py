@@ -0,0 +1,105 @@
+import math
+import os
+
+import faiss
+import numpy as np
+
+INDEX_TYPES = ("auto", "flat", "hnsw", "sq16", "sq8", "ivfpq")
+# In auto mode, the corpus size (in chunks) at which each type takes over
+AUTO_THRESHOLDS = ((100_000, "ivfpq"), (20_000, "sq8"))
+# Vectors needed before a trained index type is worth building
+MIN_TRAIN = {"sq8": 1000, "ivfpq": 10_000}
+# Indexes are only ever migrated towards more compression, never back
+COMPRESSION_RANK = {"flat": 0, "hnsw": 1, "sq16": 1, "sq8": 2, "ivfpq": 3}
+
+
+class IndexConfig:
+    """Which FAISS index the merged vector store uses, and its search settings.
+
+    index_type is one of INDEX_TYPES; "auto" keeps exact search for small
+    corpora and switches to int8 scalar or product quantization as the
+    number of chunks grows.
+    """
+
+    def __init__(self, index_type=None, hnsw_m=32, ef_search=64, nprobe=16):
+        index_type = index_type or os.environ.get("ASTRALEARN_INDEX_TYPE", "auto")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(
+                f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}"
+            )
+        self.index_type = index_type
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.nprobe = nprobe
+
+    def target_type(self, count):
+        """Index type to use for a store holding count vectors"""
+        if self.index_type == "auto":
+            for threshold, index_type in AUTO_THRESHOLDS:
+                if count >= threshold:
+                    return index_type
+            return "flat"
+        if count < MIN_TRAIN.get(self.index_type, 0):
+            # Too few vectors to train on yet; stay exact until there are
+            return "flat"
+        return self.index_type
+
+    def build(self, index_type, vectors):
+        """Train and fill a FAISS index of index_type with vectors"""
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        index = faiss.index_factory(
+            vectors.shape[1], self.factory_string(index_type, *vectors.shape)
+        )
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+        self.tune(index)
+        return index
+
+    def factory_string(self, index_type, count, dim):
+        if index_type == "flat":
+            return "Flat"
+        if index_type == "hnsw":
+            return f"HNSW{self.hnsw_m}"
+        if index_type == "sq16":
+            return "SQfp16"
+        if index_type == "sq8":
+            return "SQ8"
+        if index_type == "ivfpq":
+            # ~4*sqrt(n) lists, each with enough points to train its centroid
+            nlist = max(1, min(int(4 * math.sqrt(count)), count // 39))
+            return f"IVF{nlist},PQ{_pq_subquantizers(dim)}"
+        raise ValueError(f"Unknown index type {index_type!r}")
+
+    def tune(self, index):
+        """Apply the search-time settings to a built index"""
+        if hasattr(index, "hnsw"):
+            index.hnsw.efSearch = self.ef_search
+        try:
+            faiss.extract_index_ivf(index).nprobe = self.nprobe
+        except RuntimeError:
+            pass  # not an IVF index
+
+
+def index_type_of(index):
+    """Best-effort name of a FAISS index in INDEX_TYPES terms"""
+    if hasattr(index, "hnsw"):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexScalarQuantizer):
+        return "sq16" if index.sq.qtype == faiss.ScalarQuantizer.QT_fp16 else "sq8"
+    return "flat"
+
+
+def index_bytes(index):
+    """Serialized size of a FAISS index, a close proxy for its memory use"""
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def _pq_subquantizers(dim):
+    """Largest sub-quantizer count that splits dim into >= 8-dim pieces"""
+    for m in range(max(dim // 8, 1), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
@@ -4,9 +4,14 @@ from pypdf import PdfReader
 from PIL import Image
 import pytesseract
 import time
-from groq import Groq
 
+from agents import tracing
+from agents.corpus import CorpusFile
+from agents.corpus_store import content_key
 from agents.integration import InternTAAgentsManager
+from agents.resources import get_corpus_store, validate_api_key
+from ingestion import extract_pdfs_parallel, get_ocr_engine
+from ingestion.pipeline import STREAM_MIN_BYTES, stream_pdf
 
 # -------------------------------
 # CUSTOM AURORA THEME
@@ -141,42 +146,26 @@ h1, h2, h3, h4, h5, h6, p, label, span {
 </style>
 """
 st.markdown(CUSTOM_CSS, unsafe_allow_html=True)
+# No-op unless ASTRALEARN_METRICS_PORT is set; starts once per process
+tracing.serve_metrics()
 
 
 # -------------------------------
 # HELPER FUNCTIONS
 # -------------------------------
 def validate_groq_key(api_key):
-    """Validate the Groq API key"""
-    try:
-        client = Groq(api_key=api_key)
-        # Test with a minimal request
-        client.chat.completions.create(
-            model="llama-3.1-8b-instant",
-            messages=[{"role": "user", "content": "Say 'OK'"}],
-            max_tokens=5,
-        )
-        return True
-    except Exception as e:
-        print(f"API key validation error: {e}")
-        return False
+    """Validate the Groq API key (cached process-wide, so reruns stay offline)"""
+    return validate_api_key(api_key)
 
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from PDF file with comprehensive extraction"""
+def extract_pages_from_pdf(pdf_file):
+    """Extract the text of every PDF page, in page order"""
     try:
         reader = PdfReader(pdf_file)
-        text = ""
-        for i, page in enumerate(reader.pages):
-            page_text = page.extract_text()
-            if page_text and page_text.strip():
-                # Clean the text and add page markers
-                clean_text = page_text.strip()
-                text += f"Page {i+1}:\n{clean_text}\n\n"
-        return text
+        return [page.extract_text() or "" for page in reader.pages]
     except Exception as e:
         print(f"Error reading PDF {pdf_file.name}: {str(e)}")
-        return ""
+        return []
 
 
 def extract_text_from_image(img_file):
@@ -189,36 +178,101 @@ def extract_text_from_image(img_file):
         return ""
 
 
-def extract_all_files_content(files):
-    """Extract text from all files with clear file identification"""
+@tracing.traced("app.extract")
+def extract_all_files_content(files, parallel=True, progress_callback=None):
+    """Extract every file once into a CorpusFile with real page numbers"""
     all_files_content = []
 
+    pdf_pages = {}
+    image_texts = {}
+    if parallel:
+        # Split PDFs into page batches across all cores in one go
+        pdf_files = [
+            (file.name, file.getvalue())
+            for file in files
+            if file.name.lower().endswith(".pdf")
+        ]
+        if pdf_files:
+            pdf_pages = extract_pdfs_parallel(pdf_files, progress_callback)
+
+        # OCR all images together so they share the worker pool
+        image_files = [f for f in files if not f.name.lower().endswith(".pdf")]
+        if image_files:
+            texts = get_ocr_engine().ocr_images([f.getvalue() for f in image_files])
+            image_texts = {f.name: text for f, text in zip(image_files, texts)}
+
     for file in files:
         file_name = file.name
         print(f"Processing: {file_name}")
 
         if file.name.lower().endswith(".pdf"):
-            content = extract_text_from_pdf(file)
+            if parallel:
+                page_texts = pdf_pages.get(file_name, [])
+            else:
+                page_texts = extract_pages_from_pdf(file)
+        elif parallel:
+            page_texts = [image_texts.get(file_name, "")]
         else:
-            content = extract_text_from_image(file)
-
-        if content and content.strip():
-            # Use clear, consistent file markers
-            formatted_content = f"📚 FILE: {file_name}\n{content}"
-            all_files_content.append(
-                {
-                    "file_name": file_name,
-                    "content": formatted_content,
-                    "raw_content": content,
-                }
-            )
-            print(f"Successfully processed: {file_name} - {len(content)} characters")
+            page_texts = [extract_text_from_image(file)]
+
+        corpus_file = CorpusFile(
+            file_name, [(i + 1, text) for i, text in enumerate(page_texts)]
+        )
+        if corpus_file:
+            all_files_content.append({"file_name": file_name, "file": corpus_file})
+            print(f"Successfully processed: {file_name} - {len(corpus_file.text)} characters")
         else:
             print(f"Failed to extract content from: {file_name}")
 
     return all_files_content
 
 
+def render_stream(token_stream, waiting_message, css_class):
+    """Render a token stream progressively and return the full text"""
+    placeholder = st.empty()
+    placeholder.info(waiting_message)
+    answer = ""
+    last_render = 0
+    for token in token_stream:
+        answer += token
+        # Re-rendering on every token would flood the websocket
+        if time.time() - last_render > 0.05:
+            placeholder.markdown(
+                f"<div class='{css_class}'>{answer}▌</div>", unsafe_allow_html=True
+            )
+            last_render = time.time()
+    placeholder.markdown(
+        f"<div class='{css_class}'>{answer}</div>", unsafe_allow_html=True
+    )
+    return answer
+
+
+def render_debug_panel():
+    """Recent traces, token totals and metric exports in the sidebar"""
+    tracer = tracing.get_tracer()
+    st.sidebar.markdown("### 🔍 Debug")
+    totals = {}
+    for (agent, _, kind), count in tracer.token_totals().items():
+        totals.setdefault(agent, {"prompt": 0, "completion": 0})[kind] += count
+    for agent, counts in sorted(totals.items()):
+        st.sidebar.caption(
+            f"{agent}: {counts['prompt']:,} prompt + {counts['completion']:,} completion tokens"
+        )
+    for trace in tracer.recent_traces(10):
+        root = trace[0][1]
+        with st.sidebar.expander(f"{root['name']} — {root['duration_ms']:.0f} ms"):
+            lines = []
+            for depth, span in trace:
+                tokens = ""
+                if span.get("prompt_tokens") or span.get("completion_tokens"):
+                    tokens = f"  [{span.get('prompt_tokens', 0)}+{span.get('completion_tokens', 0)} tok]"
+                lines.append(f"{'  ' * depth}{span['name']:<24} {span['duration_ms']:>9.1f} ms{tokens}")
+            st.text("\n".join(lines))
+    st.sidebar.download_button(
+        "⬇️ Prometheus metrics", tracer.prometheus_text(), "astralearn_metrics.txt"
+    )
+
+
 # -------------------------------
 # SIDEBAR
 # -------------------------------
@@ -310,37 +364,101 @@ if "last_user_input" not in st.session_state:
 # LOAD MATERIAL - PROCESS ALL FILES
 # -------------------------------
 if uploaded_files:
-    # Check if we have new files to process
+    # Only extract and embed files that changed since the last run
     current_file_names = set([f.name for f in uploaded_files])
-    if (
-        not st.session_state.all_files_data
-        or current_file_names != st.session_state.processed_files
-    ):
+    if current_file_names != st.session_state.processed_files:
+        added_files = [
+            f for f in uploaded_files
+            if f.name not in st.session_state.processed_files
+        ]
+        removed_names = st.session_state.processed_files - current_file_names
 
         with st.sidebar:
-            with st.spinner("📚 Processing all uploaded files..."):
-                all_files_data = extract_all_files_content(uploaded_files)
-
-                if all_files_data:
-                    st.session_state.all_files_data = all_files_data
-                    st.session_state.processed_files = current_file_names
-
-                    # Combine all content for the agent manager with clear separation
-                    combined_text = ""
-                    for file_data in all_files_data:
-                        combined_text += file_data["content"] + "\n\n"
-
-                    # Load the combined text into the agent manager
-                    st.session_state.agent_manager.load_material(combined_text)
+            with st.spinner("📚 Processing uploaded files..."):
+                for name in removed_names:
+                    st.session_state.agent_manager.remove_file(name)
+                for file_data in st.session_state.all_files_data:
+                    if file_data["file_name"] in removed_names and file_data.get("lease"):
+                        file_data["lease"].release()
+                st.session_state.all_files_data = [
+                    file_data
+                    for file_data in st.session_state.all_files_data
+                    if file_data["file_name"] not in removed_names
+                ]
+
+                progress = st.empty()
+
+                def show_progress(file_name, pages_done, page_count):
+                    progress.caption(f"📄 {file_name}: {pages_done}/{page_count} pages")
+
+                # Files another session already parsed are attached from
+                # the shared corpus store instead of being extracted again
+                corpus_store = get_corpus_store()
+                store_keys = {
+                    f.name: ("file", content_key(f.name, f.getvalue())) for f in added_files
+                }
+                shared_files_data = []
+                for file in added_files:
+                    lease = corpus_store.attach(store_keys[file.name])
+                    if lease is not None:
+                        shared_files_data.append(
+                            {"file_name": file.name, "file": lease.value, "lease": lease}
+                        )
+                shared_names = {file_data["file_name"] for file_data in shared_files_data}
+                pending_files = [f for f in added_files if f.name not in shared_names]
+
+                # Large PDFs are embedded page batch by page batch while
+                # extraction continues, instead of all at once afterwards
+                streamed_files = [
+                    f for f in pending_files
+                    if f.name.lower().endswith(".pdf") and f.size >= STREAM_MIN_BYTES
+                ]
+                new_files_data = extract_all_files_content(
+                    [f for f in pending_files if f not in streamed_files],
+                    progress_callback=show_progress,
+                )
+                for file in streamed_files:
+                    try:
+                        corpus_file = stream_pdf(
+                            st.session_state.agent_manager.rag,
+                            file.name,
+                            file.getvalue(),
+                            progress_callback=show_progress,
+                        )
+                    except Exception as e:
+                        # Skip the file like the batch extraction path does
+                        print(f"Error reading PDF {file.name}: {str(e)}")
+                        corpus_file = None
+                    if corpus_file:
+                        new_files_data.append({"file_name": file.name, "file": corpus_file})
+                progress.empty()
+                for file_data in new_files_data:
+                    corpus_file = file_data["file"]
+                    lease = corpus_store.publish(
+                        store_keys[file_data["file_name"]], corpus_file, corpus_file.nbytes()
+                    )
+                    file_data["file"] = lease.value
+                    file_data["lease"] = lease
+                upload_order = {f.name: i for i, f in enumerate(added_files)}
+                new_files_data = sorted(
+                    shared_files_data + new_files_data,
+                    key=lambda file_data: upload_order[file_data["file_name"]],
+                )
+                with tracing.span("app.index", files=len(new_files_data)):
+                    st.session_state.agent_manager.add_files(
+                        [file_data["file"] for file_data in new_files_data]
+                    )
+                st.session_state.all_files_data += new_files_data
+                st.session_state.processed_files = current_file_names
 
+                if new_files_data:
                     # Show success message with file details
-                    file_names = [data["file_name"] for data in all_files_data]
-                    st.success(f"✅ Successfully loaded {len(all_files_data)} files:")
-                    for name in file_names:
-                        st.success(f"   • {name}")
-                else:
+                    st.success(f"✅ Successfully loaded {len(new_files_data)} files:")
+                    for file_data in new_files_data:
+                        st.success(f"   • {file_data['file_name']}")
+                elif added_files:
                     st.error(
-                        "❌ Could not extract text from any files. Please try different files."
+                        "❌ Could not extract text from the new files. Please try different files."
                     )
 
 # -------------------------------
@@ -512,7 +630,7 @@ if send_button and user_input:
         st.warning("⏳ Please wait for the current request to complete")
         st.stop()
 
-    # Rate limiting (2 second cooldown)
+    # Guard against double submits; LLM rate limits are queued in agents/scheduler.py
     if time.time() - st.session_state.last_request_time < 2:
         st.warning("⏳ Please wait a moment before sending another request")
         st.stop()
@@ -530,23 +648,29 @@ if send_button and user_input:
         st.session_state.last_request_time = time.time()
 
         if mode == "📘 RAG — Detailed Answers":
-            with st.spinner(
-                "🔍 Generating comprehensive explanation from all files..."
-            ):
-                answer = st.session_state.agent_manager.run_rag(user_input)
+            with tracing.span("app.rag"):
+                answer = render_stream(
+                    st.session_state.agent_manager.run_rag_stream(user_input),
+                    "🔍 Generating comprehensive explanation from all files...",
+                    "stCard",
+                )
             st.session_state.conversation.append(
                 {"role": "assistant", "content": answer}
             )
 
         elif mode == "📝 Summarizer":
-            with st.spinner("📋 Creating comprehensive summary from all files..."):
-                answer = st.session_state.agent_manager.run_summary(user_input)
+            with tracing.span("app.summary"):
+                answer = render_stream(
+                    st.session_state.agent_manager.run_summary_stream(user_input),
+                    "📋 Creating comprehensive summary from all files...",
+                    "bullet-points",
+                )
             st.session_state.conversation.append(
-                {"role": "assistant", "content": answer}
+                {"role": "assistant", "content": answer.strip()}
             )
 
         elif mode == "🧪 Test Generator":
-            with st.spinner("🎯 Generating test question from all files..."):
+            with st.spinner("🎯 Generating test question from all files..."), tracing.span("app.mcq"):
                 q, ch, correct, expl = st.session_state.agent_manager.generate_mcq()
 
             st.session_state.test_state = {
@@ -580,7 +704,7 @@ if st.session_state.all_files_data:
     total_words = 0
     for file_data in st.session_state.all_files_data:
         file_name = file_data["file_name"]
-        word_count = len(file_data["raw_content"].split())
+        word_count = file_data["file"].word_count
         total_words += word_count
         st.sidebar.markdown(f"• {file_name} ({word_count:,} words)")
 
@@ -590,11 +714,12 @@ if st.session_state.all_files_data:
     if st.sidebar.checkbox("Show file content preview"):
         for file_data in st.session_state.all_files_data:
             with st.sidebar.expander(f"📄 {file_data['file_name']}"):
-                preview = (
-                    file_data["raw_content"][:500] + "..."
-                    if len(file_data["raw_content"]) > 500
-                    else file_data["raw_content"]
-                )
+                text = file_data["file"].text
+                preview = text[:500] + "..." if len(text) > 500 else text
                 st.text(preview)
 else:
     st.sidebar.warning("📁 No material loaded")
+
+# Only offered when tracing is on (ASTRALEARN_TRACE=1)
+if tracing.enabled() and st.sidebar.checkbox("Show debug panel"):
+    render_debug_panel()
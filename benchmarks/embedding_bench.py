@@ -0,0 +1,93 @@
+"""Measure embedding throughput (chunks/sec) of the torch and ONNX backends.
+
+Chunks are produced the way LangChainRAG produces them, then embedded by
+the current sentence-transformers path and by the int8 ONNX backend at
+each batch size. Agreement is the mean cosine similarity to torch.
+
+    python -m benchmarks.embedding_bench path/to/pdfs --batch-sizes 32,64,128
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.onnx_embeddings import OnnxEmbeddings  # noqa: E402
+from agents.resources import DEFAULT_EMBEDDING_MODEL  # noqa: E402
+from benchmarks.retrieval_bench import load_corpus_files  # noqa: E402
+
+
+def load_chunks(paths, limit):
+    # Same splitter settings as LangChainRAG
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=150)
+    chunks = []
+    for corpus_file in load_corpus_files(paths):
+        chunks.extend(text for text, _ in corpus_file.split(splitter))
+    return chunks[:limit] if limit else chunks
+
+
+def measure(name, embeddings, chunks, reference=None):
+    embeddings.embed_documents(chunks[:8])  # warm-up
+    start = time.perf_counter()
+    vectors = np.asarray(embeddings.embed_documents(chunks), dtype=np.float32)
+    seconds = time.perf_counter() - start
+    result = {
+        "backend": name,
+        "chunks": len(chunks),
+        "seconds": seconds,
+        "chunks_per_sec": len(chunks) / seconds if seconds else 0.0,
+    }
+    if reference is not None:
+        norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+        result["cosine_vs_torch"] = float(np.mean((vectors * reference).sum(axis=1) / norms))
+    return result, vectors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="PDF/TXT files or directories")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--limit", type=int, default=2000, help="max chunks to embed")
+    parser.add_argument("--batch-sizes", default="32,64,128")
+    parser.add_argument("--threads", type=int, default=0, help="ONNX intra-op threads, 0 = auto")
+    parser.add_argument("--skip-torch", action="store_true")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    chunks = load_chunks(args.paths, args.limit)
+    if not chunks:
+        sys.exit("No text found in the given paths")
+
+    results = []
+    reference = None
+    if not args.skip_torch:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        result, reference = measure(
+            "torch", HuggingFaceEmbeddings(model_name=args.model), chunks
+        )
+        results.append(result)
+    for batch_size in [int(size) for size in args.batch_sizes.split(",")]:
+        embeddings = OnnxEmbeddings(args.model, batch_size=batch_size, threads=args.threads)
+        result, _ = measure(f"onnx-int8/b{batch_size}", embeddings, chunks, reference)
+        results.append(result)
+
+    print(f"{'backend':<16} {'chunks/s':>9} {'seconds':>8} {'cosine':>7}")
+    for result in results:
+        cosine = result.get("cosine_vs_torch")
+        print(
+            f"{result['backend']:<16} {result['chunks_per_sec']:>9.1f} "
+            f"{result['seconds']:>8.2f} {'' if cosine is None else f'{cosine:.4f}':>7}"
+        )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""Compare FAISS index types on recall@k, memory and query latency.
+
+Recall is measured against exact (flat) search over the same vectors.
+Vectors come from an embedded corpus, or from a synthetic clustered set
+for sizes larger than the corpus at hand.
+
+    python -m benchmarks.index_bench path/to/pdfs --k 8
+    python -m benchmarks.index_bench --synthetic 200000 --dim 384
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.index_cache import IndexCache  # noqa: E402
+from agents.langchain_wrapper import LangChainRAG  # noqa: E402
+from agents.vector_index import INDEX_TYPES, IndexConfig, index_bytes  # noqa: E402
+from benchmarks.retrieval_bench import load_corpus_files, percentile, sample_queries  # noqa: E402
+
+
+def corpus_vectors(paths, queries, seed):
+    """Chunk vectors of the corpus plus embedded sample queries"""
+    rag = LangChainRAG(
+        "benchmark", index_cache=IndexCache(cache_dir=tempfile.mkdtemp()),
+        index_config=IndexConfig("flat"),
+    )
+    for corpus_file in load_corpus_files(paths):
+        rag.add_file(corpus_file)
+    if rag.vectorstore is None:
+        sys.exit("No text found in the given paths")
+    index = rag.vectorstore.index
+    vectors = index.reconstruct_n(0, index.ntotal)
+    texts = [query for query, _ in sample_queries(rag, queries, seed)]
+    query_vectors = np.asarray(rag.embeddings.embed_documents(texts), dtype=np.float32)
+    return vectors, query_vectors
+
+
+def synthetic_vectors(count, dim, queries, seed):
+    """Clustered unit vectors, roughly shaped like sentence embeddings"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(count // 500, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)]
+    vectors += 0.5 * rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    picks = vectors[rng.integers(0, count, queries)]
+    query_vectors = picks + 0.1 * rng.standard_normal(picks.shape).astype(np.float32)
+    return vectors, query_vectors.astype(np.float32)
+
+
+def measure(config, index_type, vectors, query_vectors, truth, k):
+    start = time.perf_counter()
+    try:
+        index = config.build(index_type, vectors)
+    except RuntimeError as e:
+        return {"index_type": index_type, "error": str(e).splitlines()[0]}
+    build_s = time.perf_counter() - start
+
+    latencies = []
+    found = []
+    for vector in query_vectors:
+        start = time.perf_counter()
+        _, positions = index.search(vector[None, :], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        found.append(positions[0])
+    hits = sum(len(set(row) & set(expected)) for row, expected in zip(found, truth))
+    return {
+        "index_type": index_type,
+        "vectors": len(vectors),
+        "build_s": build_s,
+        "memory_mb": index_bytes(index) / (1024 * 1024),
+        "recall_at_k": hits / (len(truth) * k),
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="*", help="PDF/TXT files or directories")
+    parser.add_argument("--synthetic", type=int, help="use this many random vectors instead")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES[1:]))
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors, query_vectors = synthetic_vectors(args.synthetic, args.dim, args.queries, args.seed)
+    elif args.paths:
+        vectors, query_vectors = corpus_vectors(args.paths, args.queries, args.seed)
+    else:
+        parser.error("give corpus paths or --synthetic N")
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(query_vectors, args.k)
+
+    config = IndexConfig("flat", ef_search=args.ef_search, nprobe=args.nprobe)
+    results = [
+        measure(config, index_type, vectors, query_vectors, truth, args.k)
+        for index_type in args.types.split(",")
+    ]
+    print(f"{'index':<7} {'recall@' + str(args.k):>10} {'MB':>9} {'build s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+    for result in results:
+        if "error" in result:
+            print(f"{result['index_type']:<7} skipped: {result['error']}")
+            continue
+        print(
+            f"{result['index_type']:<7} {result['recall_at_k']:>10.3f} "
+            f"{result['memory_mb']:>9.2f} {result['build_s']:>8.2f} "
+            f"{result['p50_ms']:>8.3f} {result['p95_ms']:>8.3f}"
+        )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""Time every ingestion and retrieval stage on a synthetic corpus as it grows.
+
+For each corpus size (files x pages) a fresh synthetic corpus is generated
+and pushed through the same code the app uses: PDF extraction (with OCR
+for files without a text layer), chunking, embedding, FAISS store
+building and merging, query embedding, dense and hybrid retrieval, RAG
+prompt assembly and the summarizer's text helpers. Each stage reports
+throughput and p50/p95 latency per call.
+
+    python -m benchmarks.pipeline_bench --sizes 2x20,8x50 --scanned 0.25 --json results.json
+    python -m benchmarks.pipeline_bench --sizes 2x20,8x50 --baseline results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pytesseract
+from langchain_community.vectorstores import FAISS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.corpus import Corpus, CorpusFile  # noqa: E402
+from agents.corpus_store import CorpusStore  # noqa: E402
+from agents.index_cache import IndexCache  # noqa: E402
+from agents.langchain_wrapper import LangChainRAG  # noqa: E402
+from agents.resources import DEFAULT_EMBEDDING_MODEL  # noqa: E402
+from agents.summarizer import SummarizerAgent  # noqa: E402
+from benchmarks.retrieval_bench import percentile, sample_queries  # noqa: E402
+from benchmarks.synthetic_corpus import generate_corpus  # noqa: E402
+from ingestion import extract_pdfs_parallel  # noqa: E402
+from ingestion.pdf import MIN_PARALLEL_PAGES  # noqa: E402
+
+EMBED_BATCH = 64
+
+
+class Stage:
+    """Latency of each call in one stage, and how many items it processed"""
+
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.latencies = []
+
+    def time(self, func, *args, items=1):
+        start = time.perf_counter()
+        result = func(*args)
+        self.latencies.append((time.perf_counter() - start) * 1000)
+        self.items += items
+        return result
+
+    def result(self):
+        seconds = sum(self.latencies) / 1000
+        return {
+            "stage": self.name,
+            "unit": self.unit,
+            "items": self.items,
+            "calls": len(self.latencies),
+            "seconds": seconds,
+            "throughput": self.items / seconds if seconds else 0.0,
+            "p50_ms": percentile(self.latencies, 50),
+            "p95_ms": percentile(self.latencies, 95),
+        }
+
+
+def ocr_available():
+    try:
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def bench_extraction(corpus, use_ocr):
+    """CorpusFiles for the synthetic PDFs, timing extraction per file.
+
+    Scanned files are OCR'd when Tesseract is installed; otherwise their
+    generated text stands in so the later stages see the full corpus.
+    """
+    # Warm-up: start the worker pool outside the measured calls
+    name, data, _ = generate_corpus(1, MIN_PARALLEL_PAGES)[0]
+    extract_pdfs_parallel([(name, data)], ocr_fallback=False)
+
+    extract = Stage("extract", "pages")
+    ocr = Stage("ocr", "pages")
+    corpus_files = []
+    for name, data, texts in corpus:
+        scanned = name.startswith("scan")
+        if scanned and not use_ocr:
+            pages = texts
+        else:
+            stage = ocr if scanned else extract
+            pages = stage.time(
+                extract_pdfs_parallel, [(name, data)], None, scanned, items=len(texts)
+            )[name]
+        corpus_files.append(CorpusFile(name, [(i + 1, text) for i, text in enumerate(pages)]))
+    return corpus_files, [stage for stage in (extract, ocr) if stage.latencies]
+
+
+def bench_size(rag, summarizer, files, pages, args, use_ocr):
+    corpus = generate_corpus(files, pages, args.scanned, args.words, args.seed)
+    corpus_files, stages = bench_extraction(corpus, use_ocr)
+
+    split = Stage("split", "chunks")
+    chunks = {}
+    for corpus_file in corpus_files:
+        chunks[corpus_file.name] = split.time(corpus_file.split, rag.splitter, items=0)
+        split.items += len(chunks[corpus_file.name])
+    stages.append(split)
+
+    embed = Stage("embed", "chunks")
+    vectors = {}
+    for corpus_file in corpus_files:
+        texts = [text for text, _ in chunks[corpus_file.name]]
+        vectors[corpus_file.name] = []
+        for i in range(0, len(texts), EMBED_BATCH):
+            batch = texts[i:i + EMBED_BATCH]
+            vectors[corpus_file.name].extend(
+                embed.time(rag.embeddings.embed_documents, batch, items=len(batch))
+            )
+    stages.append(embed)
+
+    build = Stage("index_build", "chunks")
+    add = Stage("index_add", "chunks")
+    rag.clear()
+    for corpus_file in corpus_files:
+        file_chunks = chunks[corpus_file.name]
+        if not file_chunks:
+            continue
+        key = rag._index_key(corpus_file)
+        store = build.time(
+            lambda: FAISS.from_embeddings(
+                [(text, vector) for (text, _), vector in zip(file_chunks, vectors[corpus_file.name])],
+                rag.embeddings,
+                metadatas=[metadata for _, metadata in file_chunks],
+                ids=[f"{key[:16]}-{i}" for i in range(len(file_chunks))],
+            ),
+            items=len(file_chunks),
+        )
+        add.time(rag.add_file, corpus_file, store, items=len(file_chunks))
+    stages.extend([build, add])
+
+    queries = [query for query, _ in sample_queries(rag, args.queries, args.seed)]
+    embed_query = Stage("embed_query", "queries")
+    dense = Stage("retrieve_dense", "queries")
+    hybrid = Stage("retrieve_hybrid", "queries")
+    prompt = Stage("rag_prompt", "queries")
+    for query in queries:
+        vector = embed_query.time(rag.embeddings.embed_query, query)
+        dense.time(rag.retrieve, query, vector, False)
+        hybrid.time(rag.retrieve, query, vector, True)
+        prompt.time(rag._build_prompt, query, vector)
+    stages.extend([embed_query, dense, hybrid, prompt])
+
+    # Regex-heavy helpers that run over the whole combined text
+    combined = rag.corpus.combined_text()
+    parse = Stage("corpus_parse", "files")
+    split_files = Stage("summary_split_files", "files")
+    windows = Stage("summary_windows", "files")
+    for _ in range(args.repeat):
+        parse.time(Corpus.from_text, combined, items=len(corpus_files))
+        split_files.time(summarizer._split_text_by_files, combined, items=len(corpus_files))
+        for corpus_file in corpus_files:
+            windows.time(summarizer._split_windows, corpus_file.text, corpus_file.page_starts)
+    stages.extend([parse, split_files, windows])
+
+    return [dict(files=files, pages=pages, **stage.result()) for stage in stages]
+
+
+def parse_sizes(text):
+    sizes = []
+    for size in text.split(","):
+        files, _, pages = size.strip().lower().partition("x")
+        sizes.append((int(files), int(pages)))
+    return sizes
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results, baseline_path):
+    """Print the change in p50 latency and throughput against a saved run"""
+    with open(baseline_path) as handle:
+        baseline = {
+            (r["files"], r["pages"], r["stage"]): r for r in json.load(handle)["results"]
+        }
+    print(f"\nvs {baseline_path}")
+    print(f"{'size':<8} {'stage':<20} {'p50':>8} {'throughput':>11}")
+    for result in results:
+        old = baseline.get((result["files"], result["pages"], result["stage"]))
+        if not old:
+            continue
+        p50 = (result["p50_ms"] / old["p50_ms"] - 1) * 100 if old["p50_ms"] else 0.0
+        rate = (result["throughput"] / old["throughput"] - 1) * 100 if old["throughput"] else 0.0
+        print(
+            f"{result['files']}x{result['pages']:<6} {result['stage']:<20} "
+            f"{p50:>+7.1f}% {rate:>+10.1f}%"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="2x20,8x50",
+                        help="comma-separated FILESxPAGES corpus sizes")
+    parser.add_argument("--scanned", type=float, default=0.25,
+                        help="fraction of files without a text layer")
+    parser.add_argument("--words", type=int, default=350, help="words per page")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="runs of the whole-corpus text helpers")
+    parser.add_argument("--model", default=DEFAULT_EMBEDDING_MODEL)
+    parser.add_argument("--backend", choices=("torch", "onnx"), default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="earlier --json output to compare against")
+    args = parser.parse_args()
+
+    rag = LangChainRAG(
+        "benchmark", embedding_model_name=args.model, embedding_backend=args.backend,
+        index_cache=IndexCache(cache_dir=tempfile.mkdtemp()),
+        # Keeps nothing unreferenced, so index_add always measures building
+        corpus_store=CorpusStore(max_bytes=0),
+    )
+    summarizer = SummarizerAgent("benchmark")
+    use_ocr = ocr_available()
+    if args.scanned and not use_ocr:
+        print("Tesseract not found: scanned files skip OCR and use their generated text",
+              file=sys.stderr)
+
+    results = []
+    print(f"{'size':<8} {'stage':<20} {'throughput':>16} {'p50 ms':>9} {'p95 ms':>9}")
+    for files, pages in parse_sizes(args.sizes):
+        for result in bench_size(rag, summarizer, files, pages, args, use_ocr):
+            results.append(result)
+            rate = f"{result['throughput']:.1f} {result['unit']}/s"
+            print(
+                f"{files}x{pages:<6} {result['stage']:<20} {rate:>16} "
+                f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f}"
+            )
+
+    if args.json:
+        meta = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "embedding": rag._embedding_id(),
+            "ocr": use_ocr,
+            "args": vars(args),
+        }
+        with open(args.json, "w") as handle:
+            json.dump({"meta": meta, "results": results}, handle, indent=2)
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
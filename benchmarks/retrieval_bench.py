@@ -0,0 +1,155 @@
+"""Compare dense-only, hybrid (BM25 + dense) and reranked retrieval on a corpus.
+
+Queries are phrases sampled from the indexed chunks, so the chunk a phrase
+came from is the ground truth. Reports recall@k and latency percentiles.
+
+    python -m benchmarks.retrieval_bench path/to/pdfs --queries 200 --rerank
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.corpus import CorpusFile  # noqa: E402
+from agents.index_cache import IndexCache  # noqa: E402
+from agents.langchain_wrapper import LangChainRAG  # noqa: E402
+from agents.reranker import DEFAULT_RERANK_MODEL, CrossEncoderReranker  # noqa: E402
+from ingestion import extract_pdfs_parallel  # noqa: E402
+
+
+def load_corpus_files(paths):
+    """CorpusFiles for every .pdf/.txt file in paths (files or directories)"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name) for name in sorted(os.listdir(path))
+            )
+        else:
+            files.append(path)
+
+    pdfs = [(os.path.basename(f), open(f, "rb").read()) for f in files if f.lower().endswith(".pdf")]
+    corpus_files = []
+    for name, pages in extract_pdfs_parallel(pdfs).items():
+        corpus_files.append(CorpusFile(name, [(i + 1, t) for i, t in enumerate(pages)]))
+    for f in files:
+        if f.lower().endswith(".txt"):
+            with open(f, encoding="utf-8") as handle:
+                corpus_files.append(CorpusFile(os.path.basename(f), [(1, handle.read())]))
+    return [corpus_file for corpus_file in corpus_files if corpus_file]
+
+
+def chunk_key(doc):
+    return doc.metadata.get("file_name"), doc.metadata.get("start")
+
+
+def sample_queries(rag, count, seed=0):
+    """(query, keys of chunks containing it) pairs drawn from indexed chunks"""
+    rng = random.Random(seed)
+    chunks = [
+        (chunk_key(doc), doc.page_content)
+        for docs in rag.get_file_chunks().values()
+        for _, doc in docs
+    ]
+    queries = []
+    for _ in range(count * 5):
+        if len(queries) >= count:
+            break
+        key, text = rng.choice(chunks)
+        words = text.split()
+        if len(words) < 12:
+            continue
+        length = rng.randint(5, 10)
+        start = rng.randint(0, len(words) - length)
+        query = " ".join(words[start:start + length])
+        truth = {other_key for other_key, other in chunks if query in other} or {key}
+        queries.append((query, truth))
+    return queries
+
+
+def percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))]
+
+
+def run(rag, queries, k, method):
+    hits = 0
+    latencies = []
+    rerank_latencies = []
+    for query, truth in queries:
+        vector = rag.embeddings.embed_query(query)
+        start = time.perf_counter()
+        if method == "rerank":
+            rag.last_timings = {}
+            docs = rag.select_passages(query, vector)[:k]
+            rerank_latencies.append(rag.last_timings["rerank"])
+        else:
+            docs = rag.retrieve(query, vector, hybrid=method == "hybrid")[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        if {chunk_key(doc) for doc in docs} & truth:
+            hits += 1
+    result = {
+        "method": method,
+        "k": k,
+        "queries": len(queries),
+        "recall_at_k": hits / len(queries) if queries else 0.0,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+    }
+    if rerank_latencies:
+        result["rerank_p50_ms"] = percentile(rerank_latencies, 50)
+        result["rerank_p95_ms"] = percentile(rerank_latencies, 95)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("paths", nargs="+", help="PDF/TXT files or directories")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rerank", nargs="?", const=DEFAULT_RERANK_MODEL,
+                        help="also measure hybrid + cross-encoder reranking")
+    parser.add_argument("--rerank-threshold", type=float,
+                        help="stop scoring once k candidates reach this score")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    rag = LangChainRAG(
+        "benchmark", index_cache=IndexCache(cache_dir=tempfile.mkdtemp())
+    )
+    rag.top_k = args.k
+    for corpus_file in load_corpus_files(args.paths):
+        rag.add_file(corpus_file)
+    if rag.vectorstore is None:
+        sys.exit("No text found in the given paths")
+
+    queries = sample_queries(rag, args.queries, args.seed)
+
+    methods = ["dense", "hybrid"]
+    if args.rerank:
+        rag.reranker = CrossEncoderReranker(
+            args.rerank, top_n=args.k, score_threshold=args.rerank_threshold
+        )
+        methods.append("rerank")
+    results = [run(rag, queries, args.k, method) for method in methods]
+    print(f"{'method':<8} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for result in results:
+        print(
+            f"{result['method']:<8} {result['recall_at_k']:>10.3f} "
+            f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f}"
+        )
+    if args.json:
+        with open(args.json, "w") as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == "__main__":
+    main()
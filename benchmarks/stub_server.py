@@ -0,0 +1,270 @@
+"""Local stand-in for the Groq chat-completions API, for offline load tests.
+
+Answers /openai/v1/chat/completions and /openai/v1/models like the real
+API. Replies are generated from the prompt deterministically, so JSON MCQ
+batches, single MCQs and bullet summaries all parse. Latency, streaming
+speed and rate limiting (429 with retry-after) are configurable. Point the
+app at it with GROQ_BASE_URL:
+
+    python -m benchmarks.stub_server --port 8765 --latency-ms 400 --rpm 30
+    GROQ_BASE_URL=http://127.0.0.1:8765 streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODELS = ("llama-3.1-8b-instant", "llama-3.3-70b-versatile")
+CHARS_PER_TOKEN = 4
+
+
+def _rng(prompt):
+    return random.Random(hashlib.sha256(prompt.encode("utf-8")).hexdigest())
+
+
+def _sentences(prompt):
+    sentences = [s.strip() for s in re.split(r"(?<=[.!?])\s+|\n+", prompt)]
+    return [s for s in sentences if len(s) > 40 and not s.isupper()] or [prompt[:200]]
+
+
+def _words(prompt):
+    return re.findall(r"[A-Za-z][A-Za-z-]{3,}", prompt) or ["concept"]
+
+
+def _mcq(rng, words):
+    picks = rng.sample(words, min(5, len(words)))
+    while len(picks) < 5:
+        picks.append(f"{picks[0]}-{len(picks)}")
+    choices = [f"{picks[i]} ({i + 1})" for i in range(1, 5)]
+    return {
+        "question": f"Which statement best describes {picks[0]}?",
+        "choices": choices,
+        "correct": "ABCD"[rng.randrange(4)],
+        "explanation": f"The material links {picks[0]} with {picks[1]}.",
+    }
+
+
+def make_reply(body):
+    """Deterministic reply text for a chat-completions request body"""
+    prompt = "\n".join(str(m.get("content", "")) for m in body.get("messages", []))
+    rng = _rng(prompt)
+    words = _words(prompt)
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        match = re.search(r"Create (\d+) different", prompt)
+        count = int(match.group(1)) if match else 3
+        return json.dumps({"questions": [_mcq(rng, words) for _ in range(count)]})
+    if "QUESTION:" in prompt and "CORRECT:" in prompt:
+        mcq = _mcq(rng, words)
+        lines = [f"QUESTION: {mcq['question']}"]
+        lines += [f"{letter}) {choice}" for letter, choice in zip("ABCD", mcq["choices"])]
+        lines += [f"CORRECT: {mcq['correct']}", f"EXPLANATION: {mcq['explanation']}"]
+        return "\n".join(lines)
+
+    budget = int(body.get("max_tokens") or 500) * CHARS_PER_TOKEN
+    sentences = _sentences(prompt)
+    lines = []
+    for _ in range(8):
+        line = f"• {rng.choice(sentences)[:160]}"
+        if sum(len(existing) + 1 for existing in lines) + len(line) > budget:
+            break
+        lines.append(line)
+    return "\n".join(lines) or "• " + " ".join(words[:12])
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=300, jitter_ms=100, tokens_per_sec=250,
+                 rpm=0, error_rate=0.0, seed=0):
+        super().__init__(address, StubHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()
+        self.stats = {"requests": 0, "rate_limited": 0}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def admit(self):
+        """None if the request may proceed, else seconds to wait (a 429)"""
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if self.rpm and len(self._recent) >= self.rpm:
+                self.stats["rate_limited"] += 1
+                return max(0.1, 60 - (now - self._recent[0]))
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats["rate_limited"] += 1
+                return 1.0
+            self._recent.append(now)
+            return None
+
+    def remaining(self):
+        with self._lock:
+            return max(0, self.rpm - len(self._recent)) if self.rpm else 1000
+
+    def delay(self):
+        with self._lock:
+            jitter = self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            data = [{"id": model, "object": "model", "owned_by": "stub"} for model in MODELS]
+            self._json(200, {"object": "list", "data": data})
+        else:
+            self._json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._json(400, {"error": {"message": "Request body is not JSON"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._json(404, {"error": {"message": f"Unknown path {self.path}"}})
+            return
+
+        retry_after = self.server.admit()
+        if retry_after is not None:
+            self._json(429, {"error": {
+                "message": "Rate limit reached for requests",
+                "type": "requests", "code": "rate_limit_exceeded",
+            }}, {"retry-after": f"{retry_after:.1f}"})
+            return
+
+        time.sleep(self.server.delay())
+        content = make_reply(body)
+        prompt_chars = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+        usage = {
+            "prompt_tokens": prompt_chars // CHARS_PER_TOKEN,
+            "completion_tokens": len(content) // CHARS_PER_TOKEN,
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        model = body.get("model", MODELS[0])
+        if body.get("stream"):
+            self._stream(completion_id, model, content, usage)
+            return
+        self._json(200, {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _stream(self, completion_id, model, content, usage):
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("cache-control", "no-cache")
+        self.send_header("connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(delta, finish_reason=None, extra=None):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            chunk.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        pause = 1 / self.server.tokens_per_sec if self.server.tokens_per_sec else 0
+        try:
+            send({"role": "assistant", "content": ""})
+            for piece in re.findall(r"\S+\s*", content):
+                send({"content": piece})
+                if pause:
+                    time.sleep(pause)
+            send({}, "stop", {"x_groq": {"id": completion_id, "usage": usage}})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(data)))
+        self.send_header("x-ratelimit-remaining-requests", str(self.server.remaining()))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve_in_thread(port=0, **options):
+    """Start a stub server on a background thread; returns the server"""
+    server = StubLLMServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300,
+                        help="time to first token")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-sec", type=float, default=250,
+                        help="streaming speed, 0 = as fast as possible")
+    parser.add_argument("--rpm", type=int, default=0,
+                        help="requests per minute before answering 429, 0 = unlimited")
+    parser.add_argument("--error-rate", type=float, default=0.0,
+                        help="fraction of requests answered with a random 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubLLMServer(
+        (args.host, args.port), latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        tokens_per_sec=args.tokens_per_sec, rpm=args.rpm,
+        error_rate=args.error_rate, seed=args.seed,
+    )
+    print(f"Stub LLM API on {server.base_url} (set GROQ_BASE_URL to use it)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"Served {server.stats['requests']} requests, "
+              f"{server.stats['rate_limited']} rate limited")
+
+
+if __name__ == "__main__":
+    main()
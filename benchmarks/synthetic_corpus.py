@@ -0,0 +1,156 @@
+"""Generate a synthetic corpus of PDFs for benchmarking.
+
+Files are either text PDFs (one text layer per page, like exported lecture
+notes) or scanned PDFs (each page a rendered image with no text layer, so
+extraction falls back to OCR). Words follow a Zipf-like distribution over a
+fixed vocabulary, so keyword and dense retrieval both behave realistically.
+
+    python -m benchmarks.synthetic_corpus out/ --files 8 --pages 50 --scanned 0.25
+"""
+import argparse
+import io
+import os
+import random
+
+from PIL import Image, ImageDraw
+
+LINE_CHARS = 90
+PAGE_SIZE = (612, 792)
+# Scanned pages are rendered at about 100 dpi
+SCAN_SIZE = (850, 1100)
+
+
+def make_vocabulary(size=3000, seed=0):
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ten", "sor", "qua", "ri", "bel", "dus", "an",
+                 "ex", "io", "pra", "ven", "tu", "gal", "om", "ne", "str", "ph"]
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(syllables) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+
+def page_text(rng, vocabulary, words, weights):
+    """One page of sentences with Zipf-distributed words"""
+    tokens = rng.choices(vocabulary, weights=weights, k=words)
+    sentences = []
+    i = 0
+    while i < len(tokens):
+        length = rng.randint(8, 20)
+        sentence = " ".join(tokens[i:i + length])
+        sentences.append(sentence[:1].upper() + sentence[1:] + ".")
+        i += length
+    return " ".join(sentences)
+
+
+def wrap(text, width=LINE_CHARS):
+    lines = []
+    current = ""
+    for word in text.split():
+        if current and len(current) + 1 + len(word) > width:
+            lines.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        lines.append(current)
+    return lines
+
+
+def make_text_pdf(pages):
+    """A PDF with one Helvetica text layer per page"""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page objects are numbered
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for text in pages:
+        escaped = [
+            line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+            for line in wrap(text)
+        ]
+        stream = "BT /F1 9 Tf 40 760 Td 11 TL " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET"
+        kids.append(f"{len(objects) + 1} 0 R")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_SIZE[0]} {PAGE_SIZE[1]}] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects) + 2} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>"
+
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+def make_scanned_pdf(pages):
+    """A PDF whose pages are images of the text, with no text layer"""
+    images = []
+    for text in pages:
+        image = Image.new("L", SCAN_SIZE, 255)
+        draw = ImageDraw.Draw(image)
+        y = 40
+        for line in wrap(text, width=120):
+            if y > SCAN_SIZE[1] - 40:
+                break
+            draw.text((40, y), line, fill=0)
+            y += 14
+        images.append(image)
+    buffer = io.BytesIO()
+    images[0].save(buffer, "PDF", save_all=True, append_images=images[1:], resolution=100)
+    return buffer.getvalue()
+
+
+def generate_corpus(files, pages, scanned=0.0, words_per_page=350, seed=0):
+    """[(file name, pdf bytes, page texts)] for files x pages synthetic PDFs.
+
+    A scanned fraction of the files has no text layer at all.
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(seed=seed)
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    scanned_files = round(files * scanned)
+    corpus = []
+    for i in range(files):
+        texts = [page_text(rng, vocabulary, words_per_page, weights) for _ in range(pages)]
+        is_scanned = i >= files - scanned_files
+        data = make_scanned_pdf(texts) if is_scanned else make_text_pdf(texts)
+        name = f"{'scan' if is_scanned else 'notes'}_{i:03d}.pdf"
+        corpus.append((name, data, texts))
+    return corpus
+
+
+def write_corpus(directory, corpus):
+    os.makedirs(directory, exist_ok=True)
+    for name, data, _ in corpus:
+        with open(os.path.join(directory, name), "wb") as handle:
+            handle.write(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("directory", help="where to write the PDFs")
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--scanned", type=float, default=0.0,
+                        help="fraction of files without a text layer")
+    parser.add_argument("--words", type=int, default=350, help="words per page")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = generate_corpus(args.files, args.pages, args.scanned, args.words, args.seed)
+    write_corpus(args.directory, corpus)
+    size = sum(len(data) for _, data, _ in corpus)
+    print(f"Wrote {len(corpus)} PDFs ({size / 1e6:.1f} MB) to {args.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""Headless AstraLearn: ingest a folder of materials and answer a batch of queries.
+
+Each line of the queries file is a JSON object such as
+    {"id": "q1", "type": "rag", "query": "What is a hash table?"}
+    {"id": "s1", "type": "summary"}
+    {"id": "m1", "type": "mcq"}
+Results are written as JSONL, one line per query as it completes, with
+latency and the API tokens the query spent (none when it was served from a
+cache or a prefetch).
+
+    python cli.py materials/ queries.jsonl -o results.jsonl --concurrency 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from agents import tracing
+from agents.corpus import CorpusFile
+from agents.integration import InternTAAgentsManager
+from ingestion import extract_pdfs_parallel, get_ocr_engine
+from ingestion.pipeline import STREAM_MIN_BYTES, stream_pdf
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+QUERY_TYPES = ("rag", "summary", "mcq")
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def load_directory(manager, directory):
+    """Extract and index every PDF/image in directory; returns the file names"""
+    paths = [
+        os.path.join(directory, name)
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith((".pdf",) + IMAGE_EXTENSIONS)
+    ]
+
+    def show_progress(file_name, pages_done, page_count):
+        log(f"📄 {file_name}: {pages_done}/{page_count} pages")
+
+    corpus_files = []
+    small_pdfs = []
+    for path in paths:
+        if not path.lower().endswith(".pdf"):
+            continue
+        with open(path, "rb") as handle:
+            data = handle.read()
+        name = os.path.basename(path)
+        if len(data) >= STREAM_MIN_BYTES:
+            try:
+                corpus_files.append(stream_pdf(manager.rag, name, data, show_progress))
+            except Exception as e:
+                # Skip the file like the batch extraction path does
+                log(f"Error reading PDF {name}: {str(e)}")
+        else:
+            small_pdfs.append((name, data))
+    for name, pages in extract_pdfs_parallel(small_pdfs, show_progress).items():
+        corpus_files.append(CorpusFile(name, [(i + 1, text) for i, text in enumerate(pages)]))
+
+    images = [path for path in paths if path.lower().endswith(IMAGE_EXTENSIONS)]
+    if images:
+        image_data = []
+        for path in images:
+            with open(path, "rb") as handle:
+                image_data.append(handle.read())
+        for path, text in zip(images, get_ocr_engine().ocr_images(image_data)):
+            corpus_files.append(CorpusFile(os.path.basename(path), [(1, text)]))
+
+    loaded = []
+    for corpus_file in corpus_files:
+        if corpus_file:
+            manager.add_file(corpus_file)
+            loaded.append(corpus_file.name)
+        else:
+            log(f"Failed to extract content from: {corpus_file.name}")
+    return loaded
+
+
+def answer(manager, request):
+    """Run one query and return its result record"""
+    query_type = request.get("type", "rag")
+    query = request.get("query", "")
+    start = time.perf_counter()
+    record = {"id": request.get("id"), "type": query_type, "query": query}
+    try:
+        with tracing.count_usage() as tokens:
+            result = _run_query(manager, query_type, query)
+        if not tokens["estimated_tokens"]:
+            del tokens["estimated_tokens"]
+        record.update(status="ok", result=result, tokens=tokens)
+    except Exception as e:
+        record.update(status="error", error=str(e))
+    record["latency_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    return record
+
+
+def _run_query(manager, query_type, query):
+    if query_type == "rag":
+        return manager.run_rag(query)
+    if query_type == "summary":
+        return manager.run_summary(query)
+    if query_type == "mcq":
+        question, options, correct, explanation = manager.generate_mcq()
+        return {
+            "question": question,
+            "options": options,
+            "correct": correct,
+            "explanation": explanation,
+        }
+    raise ValueError(f"unknown query type {query_type!r}, expected one of {QUERY_TYPES}")
+
+
+def read_queries(path):
+    requests = []
+    with open(path, encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, 1):
+            line = line.strip()
+            if not line:
+                continue
+            request = json.loads(line)
+            request.setdefault("id", line_number)
+            requests.append(request)
+    return requests
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("materials", help="directory of PDFs and images")
+    parser.add_argument("queries", help="JSONL file of queries")
+    parser.add_argument("-o", "--output", help="results JSONL (default: stdout)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--api-key", default=os.environ.get("GROQ_API_KEY"),
+                        help="Groq API key (default: $GROQ_API_KEY)")
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("set GROQ_API_KEY or pass --api-key")
+
+    requests = read_queries(args.queries)
+    manager = InternTAAgentsManager(args.api_key)
+    start = time.perf_counter()
+    loaded = load_directory(manager, args.materials)
+    if not loaded:
+        sys.exit(f"No readable PDFs or images in {args.materials}")
+    log(f"Loaded {len(loaded)} file(s) in {time.perf_counter() - start:.1f}s")
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+            futures = [
+                pool.submit(answer, manager, request)
+                for request in requests
+            ]
+            for future in as_completed(futures):
+                output.write(json.dumps(future.result(), ensure_ascii=False) + "\n")
+                output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+    log(f"Answered {len(requests)} queries in {elapsed:.1f}s "
+        f"({len(requests) / elapsed if elapsed else 0:.2f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2 @@
+from .pdf import extract_pdfs_parallel, format_pages
+from .ocr import OCREngine, get_ocr_engine
@@ -0,0 +1,205 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures.process import BrokenProcessPool
+
+import pytesseract
+from PIL import Image, ImageOps
+from pypdf import PdfReader
+
+from ingestion.pool import get_process_pool, reset_process_pool
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # fall back to the images embedded in each page
+    pdfium = None
+
+# Tesseract is tuned for ~300 DPI scans
+TARGET_DPI = 300
+# Bounds on the long side of images with no DPI information
+MIN_LONG_SIDE = 1600
+MAX_LONG_SIDE = 4200
+
+
+def preprocess_image(img):
+    """Grayscale, rescale towards TARGET_DPI and binarize an image for OCR"""
+    dpi = img.info.get("dpi")
+    img = ImageOps.exif_transpose(img).convert("L")
+
+    long_side = max(img.size)
+    if dpi and dpi[0] and 0 < dpi[0] < 1200:
+        scale = TARGET_DPI / float(dpi[0])
+    elif long_side < MIN_LONG_SIDE:
+        scale = MIN_LONG_SIDE / float(long_side)
+    elif long_side > MAX_LONG_SIDE:
+        scale = MAX_LONG_SIDE / float(long_side)
+    else:
+        scale = 1.0
+    # Never blow small images up past what the long-side bound allows
+    scale = min(scale, MAX_LONG_SIDE / float(long_side))
+    if abs(scale - 1.0) > 0.05:
+        size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        img = img.resize(size, Image.LANCZOS)
+
+    threshold = _otsu_threshold(img.histogram())
+    return img.point(lambda value: 255 if value > threshold else 0, mode="1")
+
+
+def ocr_image_bytes(data):
+    """Run tesseract on one encoded image (executed in a worker process)"""
+    # One tesseract thread per worker; the pool already uses every core
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+    img = preprocess_image(Image.open(io.BytesIO(data)))
+    return pytesseract.image_to_string(img, config=f"--dpi {TARGET_DPI}")
+
+
+def render_pdf_page(path, page_index):
+    """Render one PDF page to PNG bytes at TARGET_DPI (worker process)"""
+    if pdfium is not None:
+        pdf = pdfium.PdfDocument(path)
+        try:
+            bitmap = pdf[page_index].render(scale=TARGET_DPI / 72.0, grayscale=True)
+            img = bitmap.to_pil()
+        finally:
+            pdf.close()
+        img.info["dpi"] = (TARGET_DPI, TARGET_DPI)
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG", dpi=(TARGET_DPI, TARGET_DPI))
+        return buffer.getvalue()
+
+    # Without a renderer, a scanned page is usually one embedded image
+    images = PdfReader(path).pages[page_index].images
+    if not images:
+        return None
+    largest = max(images, key=lambda image: len(image.data))
+    return largest.data
+
+
+class OCREngine:
+    """Process-pool OCR with an in-memory cache keyed by image hash"""
+
+    def __init__(self, max_cache_entries=1024):
+        self.max_cache_entries = max_cache_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def ocr_images(self, images):
+        """OCR a list of encoded images, returning their texts in order"""
+        results = [""] * len(images)
+        pending = {}
+        for i, data in enumerate(images):
+            if not data:
+                continue
+            key = hashlib.sha256(data).hexdigest()
+            cached = self._cache_get(key)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending.setdefault(key, (data, []))[1].append(i)
+
+        if not pending:
+            return results
+
+        keys = list(pending)
+        texts = self._map(ocr_image_bytes, [(pending[key][0],) for key in keys])
+        for key, text in zip(keys, texts):
+            if text is None:
+                continue
+            self._cache_put(key, text)
+            for i in pending[key][1]:
+                results[i] = text
+        return results
+
+    def ocr_pdf_pages(self, pages):
+        """Render (path, page_index) pairs and OCR them, returning texts in order"""
+        rendered = self._map(render_pdf_page, list(pages))
+        return self.ocr_images(rendered)
+
+    def _map(self, func, arg_list):
+        """Run func over arg_list in the process pool, serially if it breaks"""
+        try:
+            pool = get_process_pool()
+            futures = [pool.submit(func, *args) for args in arg_list]
+            return [self._result(future) for future in futures]
+        except BrokenProcessPool as e:
+            print(f"OCR pool failed, continuing serially: {str(e)}")
+            reset_process_pool()
+            return [self._call(func, args) for args in arg_list]
+
+    @staticmethod
+    def _result(future):
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            print(f"OCR task failed: {str(e)}")
+            return None
+
+    @staticmethod
+    def _call(func, args):
+        try:
+            return func(*args)
+        except Exception as e:
+            print(f"OCR task failed: {str(e)}")
+            return None
+
+    def _cache_get(self, key):
+        with self._lock:
+            text = self._cache.get(key)
+            if text is not None:
+                self._cache.move_to_end(key)
+            return text
+
+    def _cache_put(self, key, text):
+        with self._lock:
+            self._cache[key] = text
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_cache_entries:
+                self._cache.popitem(last=False)
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_ocr_engine():
+    """Return the OCR engine shared by all sessions in this process"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = OCREngine()
+        return _engine
+
+
+def _otsu_threshold(histogram):
+    """Pick the gray level that best separates ink from paper"""
+    total = sum(histogram)
+    if not total:
+        return 127
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+
+    background_count = 0
+    background_sum = 0
+    best_threshold = 127
+    best_variance = -1.0
+    for level, count in enumerate(histogram):
+        background_count += count
+        if background_count == 0:
+            continue
+        foreground_count = total - background_count
+        if foreground_count == 0:
+            break
+        background_sum += level * count
+        background_mean = background_sum / background_count
+        foreground_mean = (weighted_total - background_sum) / foreground_count
+        variance = (
+            background_count * foreground_count
+            * (background_mean - foreground_mean) ** 2
+        )
+        if variance > best_variance:
+            best_variance = variance
+            best_threshold = level
+    return best_threshold
@@ -0,0 +1,206 @@
+import math
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from pypdf import PdfReader
+
+from ingestion.ocr import get_ocr_engine
+from ingestion.pool import default_workers, get_process_pool, reset_process_pool
+
+# Below this many pages the pool round trip costs more than it saves
+MIN_PARALLEL_PAGES = 8
+# Several tasks per worker keep the pool busy when PDFs differ in size
+TASKS_PER_WORKER = 4
+
+
+def extract_page_texts(path, start, end):
+    """Extract text from pages [start, end) of the PDF at path"""
+    reader = PdfReader(path)
+    texts = []
+    for i in range(start, end):
+        try:
+            texts.append(reader.pages[i].extract_text() or "")
+        except Exception as e:
+            print(f"Error reading page {i+1} of {path}: {str(e)}")
+            texts.append("")
+    return start, texts
+
+
+def format_pages(page_texts):
+    """Join page texts with the 'Page N:' markers used across the app"""
+    parts = []
+    for i, page_text in enumerate(page_texts):
+        if page_text and page_text.strip():
+            # Clean the text and add page markers
+            parts.append(f"Page {i+1}:\n{page_text.strip()}\n\n")
+    return "".join(parts)
+
+
+def extract_pdfs_parallel(pdf_files, progress_callback=None, ocr_fallback=True):
+    """Extract every page of several PDFs across the shared process pool.
+
+    pdf_files is a list of (file_name, data) pairs. Returns a dict mapping
+    each readable file name to its page texts in page order.
+    progress_callback(file_name, pages_done, page_count) is called from the
+    calling thread whenever a batch of pages finishes. With ocr_fallback,
+    pages without a text layer are rendered and OCR'd.
+    """
+    results = {}
+    jobs = []
+    tmp_paths = []
+    try:
+        for file_name, data in pdf_files:
+            # Workers read from disk so the PDF bytes are not pickled per task
+            path = _write_temp_pdf(data)
+            tmp_paths.append(path)
+            try:
+                page_count = len(PdfReader(path).pages)
+            except Exception as e:
+                print(f"Error reading PDF {file_name}: {str(e)}")
+                continue
+            results[file_name] = [""] * page_count
+            jobs.append((file_name, path, page_count))
+
+        total_pages = sum(page_count for _, _, page_count in jobs)
+        if total_pages < MIN_PARALLEL_PAGES:
+            _extract_serial(jobs, results, progress_callback)
+        else:
+            try:
+                _extract_pooled(jobs, results, total_pages, progress_callback)
+            except BrokenProcessPool as e:
+                print(f"Extraction pool failed, continuing serially: {str(e)}")
+                reset_process_pool()
+                _extract_serial(jobs, results, progress_callback)
+
+        if ocr_fallback:
+            _ocr_textless_pages(jobs, results)
+        return results
+    finally:
+        for path in tmp_paths:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def iter_pdf_pages(path, batch_pages=16, ocr_fallback=True):
+    """Yield (page_number, text) for the PDF at path, in page order.
+
+    Page batches run on the shared process pool with at most two batches
+    per worker in flight, so memory stays bounded however long the PDF is.
+    """
+    page_count = pdf_page_count(path)
+    if page_count < MIN_PARALLEL_PAGES:
+        batches = (extract_page_texts(path, 0, page_count),)
+    else:
+        batches = _iter_pooled_batches(path, page_count, batch_pages)
+
+    for start, texts in batches:
+        if ocr_fallback:
+            textless = [i for i, text in enumerate(texts) if not text.strip()]
+            if textless:
+                ocr_texts = get_ocr_engine().ocr_pdf_pages(
+                    [(path, start + i) for i in textless]
+                )
+                for i, text in zip(textless, ocr_texts):
+                    texts[i] = text or ""
+        for i, text in enumerate(texts):
+            yield start + i + 1, text
+
+
+def pdf_page_count(path):
+    """Number of pages in the PDF at path"""
+    return len(PdfReader(path).pages)
+
+
+def _iter_pooled_batches(path, page_count, batch_pages):
+    pool = get_process_pool()
+    max_inflight = default_workers() * 2
+    pending = deque()
+    next_start = 0  # first page not yielded yet
+    try:
+        for start in range(0, page_count, batch_pages):
+            pending.append(pool.submit(
+                extract_page_texts, path, start, min(start + batch_pages, page_count)
+            ))
+            if len(pending) >= max_inflight:
+                start, texts = pending.popleft().result()
+                next_start = start + len(texts)
+                yield start, texts
+        while pending:
+            start, texts = pending.popleft().result()
+            next_start = start + len(texts)
+            yield start, texts
+    except BrokenProcessPool as e:
+        print(f"Extraction pool failed, continuing serially: {str(e)}")
+        reset_process_pool()
+        for start in range(next_start, page_count, batch_pages):
+            yield extract_page_texts(path, start, min(start + batch_pages, page_count))
+
+
+def _extract_pooled(jobs, results, total_pages, progress_callback):
+    batch_size = max(
+        1, math.ceil(total_pages / (default_workers() * TASKS_PER_WORKER))
+    )
+    pool = get_process_pool()
+    futures = {}
+    for file_name, path, page_count in jobs:
+        for start in range(0, page_count, batch_size):
+            end = min(start + batch_size, page_count)
+            futures[pool.submit(extract_page_texts, path, start, end)] = file_name
+
+    pages_done = {file_name: 0 for file_name, _, _ in jobs}
+    for future in as_completed(futures):
+        file_name = futures[future]
+        try:
+            start, texts = future.result()
+        except BrokenProcessPool:
+            raise
+        except Exception as e:
+            print(f"Error extracting pages of {file_name}: {str(e)}")
+            continue
+        results[file_name][start:start + len(texts)] = texts
+        pages_done[file_name] += len(texts)
+        if progress_callback:
+            progress_callback(
+                file_name, pages_done[file_name], len(results[file_name])
+            )
+
+
+def _extract_serial(jobs, results, progress_callback):
+    for file_name, path, page_count in jobs:
+        try:
+            _, texts = extract_page_texts(path, 0, page_count)
+        except Exception as e:
+            print(f"Error reading PDF {file_name}: {str(e)}")
+            continue
+        results[file_name] = texts
+        if progress_callback:
+            progress_callback(file_name, page_count, page_count)
+
+
+def _ocr_textless_pages(jobs, results):
+    """Send only the pages without a text layer through OCR"""
+    targets = []
+    for file_name, path, _ in jobs:
+        for i, text in enumerate(results.get(file_name, [])):
+            if not text.strip():
+                targets.append((file_name, path, i))
+    if not targets:
+        return
+
+    print(f"Running OCR on {len(targets)} page(s) without a text layer")
+    texts = get_ocr_engine().ocr_pdf_pages(
+        [(path, i) for _, path, i in targets]
+    )
+    for (file_name, _, i), text in zip(targets, texts):
+        results[file_name][i] = text or ""
+
+
+def _write_temp_pdf(data):
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(data)
+        return tmp.name
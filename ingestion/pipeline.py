@@ -0,0 +1,237 @@
+import hashlib
+import os
+import queue
+import threading
+from bisect import bisect_right
+
+from langchain_community.vectorstores import FAISS
+
+from agents import tracing
+from agents.corpus import CorpusFile, format_page, locate_chunks
+from agents.index_cache import IndexCache
+from ingestion.pdf import _write_temp_pdf, iter_pdf_pages, pdf_page_count
+
+# PDFs at least this large are streamed instead of extracted up front
+STREAM_MIN_BYTES = int(os.environ.get("ASTRALEARN_STREAM_MIN_MB", "20")) * 1024 * 1024
+EMBED_BATCH = int(os.environ.get("ASTRALEARN_STREAM_BATCH", "64"))
+QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+class StreamingChunker:
+    """Splits pages into chunks as they arrive, with offsets into CorpusFile.text.
+
+    Text is buffered until it spans several chunks; every chunk but the last
+    (which may continue on the next page) is emitted and the buffer is cut
+    back to where that last chunk starts.
+    """
+
+    def __init__(self, splitter, file_name, window_chars=None):
+        self.splitter = splitter
+        self.file_name = file_name
+        self.overlap = getattr(splitter, "_chunk_overlap", 0)
+        self.window_chars = window_chars or getattr(splitter, "_chunk_size", 1000) * 8
+        self.page_numbers = []
+        self.page_starts = []
+        self._buffer = ""
+        self._buffer_start = 0
+        self._offset = 0
+
+    def feed(self, number, page_text):
+        """Add a page; return the (chunk_text, metadata) pairs now complete"""
+        part = format_page(number, page_text)
+        if not part:
+            return []
+        self.page_numbers.append(number)
+        self.page_starts.append(self._offset)
+        self._offset += len(part)
+        self._buffer += part
+        if len(self._buffer) < self.window_chars:
+            return []
+        return self._drain(final=False)
+
+    def finish(self):
+        """Return the chunks left in the buffer"""
+        return self._drain(final=True)
+
+    def _drain(self, final):
+        texts = self.splitter.split_text(self._buffer)
+        starts = locate_chunks(self._buffer, texts, self.overlap)
+        if not final and len(texts) > 1:
+            keep_from = starts[-1]
+            texts, starts = texts[:-1], starts[:-1]
+        elif not final:
+            return []
+        else:
+            keep_from = len(self._buffer)
+
+        chunks = []
+        for chunk, start in zip(texts, starts):
+            start += self._buffer_start
+            chunks.append((chunk, {
+                "file_name": self.file_name,
+                "page": self._page_at(start),
+                "start": start,
+            }))
+        self._buffer = self._buffer[keep_from:]
+        self._buffer_start += keep_from
+        return chunks
+
+    def _page_at(self, offset):
+        i = bisect_right(self.page_starts, offset) - 1
+        return self.page_numbers[max(i, 0)] if self.page_numbers else None
+
+
+@tracing.traced("ingest.stream_pdf")
+def stream_pdf(rag, file_name, data, progress_callback=None,
+               batch_size=EMBED_BATCH, queue_size=QUEUE_SIZE):
+    """Extract, chunk, embed and index one PDF as a pipeline; returns its CorpusFile.
+
+    Pages -> chunks -> embedding batches run in separate threads joined by
+    bounded queues, so embedding starts while later pages are still being
+    extracted and only a few batches of chunks and vectors wait at once.
+    This bounds the chunk and vector working set, not peak memory: the
+    upload's bytes and every page's text are still held, because the
+    returned CorpusFile.text feeds the summary and MCQ agents.
+    progress_callback(file_name, pages_done, page_count) is called from the
+    calling thread.
+    """
+    source_key = IndexCache.make_key(
+        hashlib.sha256(data).hexdigest(), file_name=file_name, **rag.index_settings()
+    )
+    path = _write_temp_pdf(data)
+    try:
+        page_count = pdf_page_count(path)
+        if rag.index_cache.resolve(source_key):
+            # Embedded before: extracting is enough, add_file hits the cache
+            pages = list(iter_pdf_pages(path))
+            if progress_callback:
+                progress_callback(file_name, page_count, page_count)
+            corpus_file = CorpusFile(file_name, pages)
+            if corpus_file:
+                rag.add_file(corpus_file)
+            return corpus_file
+
+        pages = []
+        # Chunk texts live in the store; only one batch at a time is held here
+        chunk_count = 0
+        store = None
+        for texts, metadatas, pages_done in _chunk_batches(
+            rag, file_name, path, pages, batch_size, queue_size
+        ):
+            vectors = rag.embeddings.embed_documents(texts)
+            # Ids only need to be unique; the content key is not known yet
+            ids = [f"{source_key[:16]}-{chunk_count + i}" for i in range(len(texts))]
+            if store is None:
+                store = FAISS.from_embeddings(
+                    list(zip(texts, vectors)), rag.embeddings, metadatas=metadatas, ids=ids
+                )
+            else:
+                store.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+            chunk_count += len(texts)
+            if progress_callback:
+                progress_callback(file_name, pages_done, page_count)
+
+        corpus_file = CorpusFile(file_name, pages)
+        if corpus_file and store is not None:
+            rag.add_file(corpus_file, store=store)
+            rag.index_cache.link(source_key, rag._index_key(corpus_file))
+        return corpus_file
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _chunk_batches(rag, file_name, path, pages, batch_size, queue_size):
+    """Yield (texts, metadatas, pages_done) batches produced by background stages"""
+    page_queue = queue.Queue(maxsize=queue_size * batch_size)
+    batch_queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def extract():
+        for page in iter_pdf_pages(path):
+            if not _put(page_queue, page, stop):
+                return
+        _put(page_queue, _DONE, stop)
+
+    def chunk():
+        chunker = StreamingChunker(rag.splitter, file_name)
+        texts, metadatas = [], []
+        while True:
+            page = _get(page_queue, stop)
+            if page is None:
+                return
+            if page is _DONE or isinstance(page, Exception):
+                break
+            pages.append(page)
+            for text, metadata in chunker.feed(*page):
+                texts.append(text)
+                metadatas.append(metadata)
+                if len(texts) >= batch_size:
+                    if not _put(batch_queue, (texts, metadatas, len(pages)), stop):
+                        return
+                    texts, metadatas = [], []
+        if isinstance(page, Exception):
+            _put(batch_queue, page, stop)
+            return
+        for text, metadata in chunker.finish():
+            texts.append(text)
+            metadatas.append(metadata)
+        if texts:
+            _put(batch_queue, (texts, metadatas, len(pages)), stop)
+        _put(batch_queue, _DONE, stop)
+
+    stages = [
+        threading.Thread(target=_guarded(extract, page_queue, stop), daemon=True),
+        threading.Thread(target=_guarded(chunk, batch_queue, stop), daemon=True),
+    ]
+    for stage in stages:
+        stage.start()
+    try:
+        while True:
+            item = batch_queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Unblock the stages if the consumer stopped early
+        stop.set()
+        for stage in stages:
+            stage.join()
+
+
+def _guarded(stage, out_queue, stop):
+    """Run stage, forwarding any error downstream instead of hanging the pipeline"""
+    def run():
+        try:
+            stage()
+        except Exception as e:
+            print(f"Ingestion stage {stage.__name__} failed: {str(e)}")
+            _put(out_queue, e, stop)
+    return run
+
+
+def _get(source_queue, stop):
+    """Blocking get that gives up with None once stop is set"""
+    while not stop.is_set():
+        try:
+            return source_queue.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return None
+
+
+def _put(target_queue, item, stop):
+    """Blocking put that gives up once stop is set"""
+    while not stop.is_set():
+        try:
+            target_queue.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
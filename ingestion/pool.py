@@ -0,0 +1,37 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def default_workers():
+    """Number of worker processes, overridable with ASTRALEARN_WORKERS"""
+    configured = os.environ.get("ASTRALEARN_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    return os.cpu_count() or 1
+
+
+def get_process_pool():
+    """Return the process pool shared by all sessions, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Streamlit runs scripts in threads, so never fork the server process
+            context = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(
+                max_workers=default_workers(), mp_context=context
+            )
+        return _pool
+
+
+def reset_process_pool():
+    """Discard a broken pool so the next call starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,63 @@
+import threading
+import time
+
+import pytest
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+from ingestion import pipeline
+
+
+class _Cache:
+    def resolve(self, key):
+        return None
+
+
+class _FailingEmbeddings:
+    """Fails on the second batch, while pages are still being extracted"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        if self.calls > 1:
+            raise RuntimeError("embedding failed")
+        return [[0.0, 1.0] for _ in texts]
+
+
+class _Rag:
+    def __init__(self):
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=100, chunk_overlap=10)
+        self.embeddings = _FailingEmbeddings()
+        self.index_cache = _Cache()
+
+    def index_settings(self):
+        return {}
+
+
+def _slow_pages(path):
+    for number in range(1, 200):
+        time.sleep(0.01)
+        yield number, f"Sentence {number} of the test page. " * 20
+
+
+def test_stream_pdf_raises_when_embedding_fails(monkeypatch):
+    monkeypatch.setattr(pipeline, "iter_pdf_pages", _slow_pages)
+    monkeypatch.setattr(pipeline, "pdf_page_count", lambda path: 199)
+
+    errors = []
+
+    def run():
+        try:
+            pipeline.stream_pdf(_Rag(), "big.pdf", b"%PDF-1.4", batch_size=4, queue_size=1)
+        except Exception as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run, daemon=True)
+    worker.start()
+    worker.join(timeout=10)
+
+    assert not worker.is_alive(), "stream_pdf hung after the embedding error"
+    assert len(errors) == 1
+    with pytest.raises(RuntimeError, match="embedding failed"):
+        raise errors[0]